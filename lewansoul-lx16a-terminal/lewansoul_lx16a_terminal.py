@@ -9,15 +9,21 @@ Website: https://github.com/maximkulkin/lewansoul-lx16a
 import sys
 
 from PyQt5.QtCore import Qt, QTimer, QThread, pyqtSignal
-from PyQt5.QtWidgets import (QWidget, QApplication, QDialog, QMessageBox, QListWidgetItem)
+from PyQt5.QtGui import QPainter, QPen, QColor
+from PyQt5.QtWidgets import (QWidget, QApplication, QDialog, QMessageBox, QListWidgetItem,
+                             QTableWidgetItem, QSizePolicy)
 from PyQt5.uic import loadUi as _loadUi
 
-from collections import namedtuple
+from array import array
+from collections import namedtuple, OrderedDict
 import pkg_resources
 import logging
+import threading
+import time
 import serial
 from serial.tools.list_ports import comports
 import lewansoul_lx16a
+from lewansoul_lx16a_telemetry import TelemetryPoller
 
 
 def loadUi(path, widget):
@@ -35,6 +41,17 @@ ServoState = namedtuple('ServoState', [
 ])
 
 
+def format_led_errors(led_errors):
+    messages = []
+    if lewansoul_lx16a.SERVO_ERROR_OVER_TEMPERATURE & led_errors:
+        messages.append('Overheating')
+    if lewansoul_lx16a.SERVO_ERROR_OVER_VOLTAGE & led_errors:
+        messages.append('Voltage is out of limits')
+    if lewansoul_lx16a.SERVO_ERROR_LOCKED_ROTOR & led_errors:
+        messages.append('Locked rotor')
+    return messages
+
+
 class ConfigureIdDialog(QDialog):
     def __init__(self):
         super(ConfigureIdDialog, self).__init__()
@@ -162,26 +179,18 @@ class ServoScanThread(QThread):
     def __init__(self, controller):
         super(ServoScanThread, self).__init__()
         self._controller = controller
+        self._cancel = lewansoul_lx16a.CancellationToken()
 
-    def _servo_exists(self, id):
-        try:
-            servo_id = self._controller.get_servo_id(id, timeout=0.2)
-            return (servo_id == id)
-        except TimeoutError:
-            return False
+    def requestInterruption(self):
+        self._cancel.cancel()
+        super(ServoScanThread, self).requestInterruption()
 
     def run(self):
-        for servoId in range(1, 253):
+        for servoId in self._controller.scan(broadcast=True, cancel=self._cancel):
             if self.isInterruptionRequested():
                 break
 
-            try:
-                if self._servo_exists(servoId):
-                    self.servoFound.emit(servoId)
-            except lewansoul_lx16a.TimeoutError:
-                pass
-
-            self.yieldCurrentThread()
+            self.servoFound.emit(servoId)
 
 
 class GetServoConfigurationThread(QThread):
@@ -193,65 +202,26 @@ class GetServoConfigurationThread(QThread):
     def __init__(self, servo):
         super(GetServoConfigurationThread, self).__init__()
         self._servo = servo
+        self._cancel = lewansoul_lx16a.CancellationToken()
+        self._retry = lewansoul_lx16a.RetryPolicy(
+            attempts=self.MAX_RETRIES, backoff=0.1, max_backoff=1.0,
+        )
 
     @property
     def servo_id(self):
         return self._servo.servo_id
 
+    def requestInterruption(self):
+        self._cancel.cancel()
+        super(GetServoConfigurationThread, self).requestInterruption()
+
     def run(self):
+        options = dict(retry=self._retry, cancel=self._cancel)
         try:
-            retries = 0
-            while True:
-                if self.isInterruptionRequested():
-                    return
-
-                try:
-                    position_limits = self._servo.get_position_limits()
-                    break
-                except lewansoul_lx16a.TimeoutError:
-                    retries += 1
-                    if retries >= self.MAX_RETRIES:
-                        raise
-                    self.sleep(1)
-
-            while True:
-                if self.isInterruptionRequested():
-                    return
-
-                try:
-                    voltage_limits = self._servo.get_voltage_limits()
-                    break
-                except lewansoul_lx16a.TimeoutError:
-                    retries += 1
-                    if retries >= self.MAX_RETRIES:
-                        raise
-                    self.sleep(1)
-
-            while True:
-                if self.isInterruptionRequested():
-                    return
-
-                try:
-                    max_temperature = self._servo.get_max_temperature_limit()
-                    break
-                except lewansoul_lx16a.TimeoutError:
-                    retries += 1
-                    if retries >= self.MAX_RETRIES:
-                        raise
-                    self.sleep(1)
-
-            while True:
-                if self.isInterruptionRequested():
-                    return
-
-                try:
-                    position_offset = self._servo.get_position_offset()
-                    break
-                except lewansoul_lx16a.TimeoutError:
-                    retries += 1
-                    if retries >= self.MAX_RETRIES:
-                        raise
-                    self.sleep(1)
+            position_limits = self._servo.get_position_limits(**options)
+            voltage_limits = self._servo.get_voltage_limits(**options)
+            max_temperature = self._servo.get_max_temperature_limit(**options)
+            position_offset = self._servo.get_position_offset(**options)
 
             self.servoConfigurationUpdated.emit(ServoConfiguration(
                 servo_id=self.servo_id,
@@ -260,48 +230,455 @@ class GetServoConfigurationThread(QThread):
                 max_temperature=max_temperature,
                 position_offset=position_offset,
             ))
+        except lewansoul_lx16a.CancelledError:
+            pass
         except lewansoul_lx16a.TimeoutError:
             self.servoConfigurationTimeout.emit()
 
 
-class ServoMonitorThread(QThread):
-    servoStateUpdated = pyqtSignal(ServoState)
+class RingBuffer(object):
+    """Fixed-size ring buffer of (time, min, max) samples.
+
+    All storage is preallocated, appending never allocates.
+    """
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self._times = array('d', [0.0]) * capacity
+        self._lows = array('d', [0.0]) * capacity
+        self._highs = array('d', [0.0]) * capacity
+        self._head = 0
+        self._count = 0
+
+    def __len__(self):
+        return self._count
+
+    def append(self, timestamp, low, high):
+        idx = self._head
+        self._times[idx] = timestamp
+        self._lows[idx] = low
+        self._highs[idx] = high
+        self._head = (idx + 1) % self.capacity
+        if self._count < self.capacity:
+            self._count += 1
+
+    def oldest(self):
+        """Returns time of oldest sample or None if buffer is empty."""
+        if not self._count:
+            return None
+        return self._times[(self._head - self._count) % self.capacity]
+
+    def since(self, start):
+        """Returns list of (time, min, max) samples not older than `start`,
+        oldest first."""
+        samples = []
+        idx = self._head
+        for _ in range(self._count):
+            idx = (idx - 1) % self.capacity
+            if self._times[idx] < start:
+                break
+            samples.append((self._times[idx], self._lows[idx], self._highs[idx]))
+        samples.reverse()
+        return samples
+
+
+class TelemetryHistory(object):
+    """History of a telemetry value with bounded memory.
+
+    Recent samples are kept as is. Every `factor` samples are also reduced
+    to their minimum and maximum into second buffer, which covers `factor`
+    times longer period with the same number of points.
+    """
+
+    def __init__(self, capacity=600, factor=10):
+        self.factor = factor
+        self.samples = RingBuffer(capacity)
+        self.decimated = RingBuffer(capacity)
+        self._bucket_start = 0.0
+        self._bucket_low = 0.0
+        self._bucket_high = 0.0
+        self._bucket_count = 0
+
+    def append(self, timestamp, value):
+        self.samples.append(timestamp, value, value)
+
+        if self._bucket_count == 0:
+            self._bucket_start = timestamp
+            self._bucket_low = self._bucket_high = value
+        else:
+            self._bucket_low = min(self._bucket_low, value)
+            self._bucket_high = max(self._bucket_high, value)
+        self._bucket_count += 1
+
+        if self._bucket_count == self.factor:
+            self.decimated.append(self._bucket_start, self._bucket_low, self._bucket_high)
+            self._bucket_count = 0
+
+    def window(self, start):
+        """Returns list of (time, min, max) samples not older than `start`,
+        oldest first. Decimated samples are used if raw samples do not
+        cover whole window."""
+        oldest = self.samples.oldest()
+        if oldest is None or oldest <= start or len(self.samples) < self.samples.capacity:
+            return self.samples.since(start)
+
+        samples = self.decimated.since(start)
+        if self._bucket_count:
+            samples.extend(self.samples.since(self._bucket_start))
+        return samples
+
+
+class ServoPollerThread(QThread):
+    """Polls telemetry of all known servos with one shared poller.
+
+    Rows of servos with changed values are reported with `rowsChanged`
+    signal at most REFRESH_RATE times per second, so GUI load does not
+    depend on polling rate.
+    """
+    rowsChanged = pyqtSignal(dict)
+
+    REFRESH_RATE = 10
+    HISTORY_FIELDS = ['position', 'speed', 'voltage', 'temperature']
+    RATES = {
+        'position': 5, 'voltage': 0.5, 'temperature': 0.5, 'mode': 1, 'speed': 1,
+        'motor_on': 1, 'led_on': 1, 'led_errors': 0.5,
+    }
 
-    def __init__(self, servo):
-        super(ServoMonitorThread, self).__init__()
-        self._servo = servo
+    def __init__(self, controller):
+        super(ServoPollerThread, self).__init__()
+        self._lock = threading.Lock()
+        self._rows = {}
+        self._changed = set()
+        self._histories = {}
+        self._poller = TelemetryPoller(controller, rates=self.RATES, timeout=0.1)
+        self._poller.subscribe(self._on_snapshot)
+
+    def add_servo(self, servo_id):
+        with self._lock:
+            if servo_id not in self._histories:
+                self._histories[servo_id] = {
+                    field: TelemetryHistory() for field in self.HISTORY_FIELDS
+                }
+        self._poller.add_servo(servo_id)
+
+    def remove_servo(self, servo_id):
+        self._poller.remove_servo(servo_id)
+        with self._lock:
+            self._rows.pop(servo_id, None)
+            self._changed.discard(servo_id)
+            self._histories.pop(servo_id, None)
+
+    def clear(self):
+        for servo_id in self._poller.servo_ids:
+            self._poller.remove_servo(servo_id)
+        with self._lock:
+            self._rows.clear()
+            self._changed.clear()
+            self._histories.clear()
+
+    def row(self, servo_id):
+        """Returns dict mapping field name to latest value for given servo."""
+        with self._lock:
+            return dict(self._rows.get(servo_id, {}))
+
+    def rows(self):
+        with self._lock:
+            return {servo_id: dict(row) for servo_id, row in self._rows.items()}
+
+    def history(self, servo_id, field, start):
+        """Returns list of (time, min, max) samples of given field
+        not older than `start` (see `TelemetryHistory.window`)."""
+        with self._lock:
+            histories = self._histories.get(servo_id)
+            if histories is None:
+                return []
+            return histories[field].window(start)
+
+    def _on_snapshot(self, snapshot):
+        with self._lock:
+            for servo_id, values in snapshot.values.items():
+                if servo_id not in self._poller.servo_ids:
+                    continue
+                row = self._rows.setdefault(servo_id, {})
+                for field, value in values.items():
+                    if row.get(field) != value:
+                        row[field] = value
+                        self._changed.add(servo_id)
+
+                histories = self._histories.get(servo_id, {})
+                for field, history in histories.items():
+                    if field in values:
+                        history.append(snapshot.timestamp, values[field])
 
     def run(self):
-        while not self.isInterruptionRequested():
-            try:
-                voltage = self._servo.get_voltage()
-                temperature = self._servo.get_temperature()
+        self._poller.start()
+        try:
+            while not self.isInterruptionRequested():
+                self.msleep(int(1000 / self.REFRESH_RATE))
+
+                with self._lock:
+                    changed = {
+                        servo_id: dict(self._rows[servo_id])
+                        for servo_id in self._changed
+                    }
+                    self._changed.clear()
+
+                if changed:
+                    self.rowsChanged.emit(changed)
+        finally:
+            self._poller.stop()
 
-                mode = self._servo.get_mode()
-                if mode == 0:
-                    position, speed = self._servo.get_position(), 0
-                else:
-                    position, speed = 0, self._servo.get_motor_speed()
 
-                motor_on = self._servo.is_motor_on()
-                led_on = self._servo.is_led_on()
-                led_errors = self._servo.get_led_errors()
+class ServoDashboard(QWidget):
+    """Table of live telemetry of all servos."""
+    COLUMNS = ['position', 'voltage', 'temperature', 'led_errors']
 
-                self.servoStateUpdated.emit(ServoState(
-                    servo_id=self._servo.servo_id,
-                    voltage=voltage,
-                    temperature=temperature,
-                    mode=mode,
-                    position=position,
-                    speed=speed,
-                    motor_on=motor_on,
-                    led_on=led_on,
-                    led_errors=led_errors,
-                ))
-            except lewansoul_lx16a.TimeoutError:
-                pass
+    def __init__(self):
+        super(ServoDashboard, self).__init__()
+        self._items = {}
+
+        loadUi('resources/ServoDashboard.ui', self)
+
+    def clear(self):
+        self.servoTable.setRowCount(0)
+        self._items = {}
+
+    def remove_row(self, servo_id):
+        if self._items.pop(servo_id, None) is None:
+            return
+        for row in range(self.servoTable.rowCount()):
+            if self.servoTable.item(row, 0).text() == str(servo_id):
+                self.servoTable.removeRow(row)
+                break
+
+    def _add_row(self, servo_id):
+        row = self.servoTable.rowCount()
+        self.servoTable.insertRow(row)
+        self.servoTable.setItem(row, 0, QTableWidgetItem(str(servo_id)))
 
-            self.sleep(1)
+        items = [QTableWidgetItem('') for _ in self.COLUMNS]
+        for column, item in enumerate(items):
+            self.servoTable.setItem(row, column + 1, item)
+        self._items[servo_id] = items
+        return items
+
+    def update_rows(self, rows):
+        """Updates cells of given rows whose text has changed.
+
+        Args:
+            rows - dict mapping servo ID to dict mapping field name to value
+        """
+        self.servoTable.setUpdatesEnabled(False)
+        try:
+            for servo_id, values in sorted(rows.items()):
+                items = self._items.get(servo_id) or self._add_row(servo_id)
+                for item, field in zip(items, self.COLUMNS):
+                    if field not in values:
+                        continue
+                    if field == 'led_errors':
+                        text = ', '.join(format_led_errors(values[field]))
+                    else:
+                        text = str(values[field])
+                    if item.text() != text:
+                        item.setText(text)
+        finally:
+            self.servoTable.setUpdatesEnabled(True)
+
+
+class TelemetryPlot(QWidget):
+    """Scrolling plot of telemetry history.
+
+    Samples are reduced to minimum and maximum per pixel column, so
+    drawing cost depends on widget width, not on number of samples.
+    """
+    MARGIN = 4
+
+    def __init__(self, title, parent=None):
+        super(TelemetryPlot, self).__init__(parent)
+        self.title = title
+        self.duration = 30.0
+        self._samples = []
+        self._now = 0.0
+
+        self.setMinimumHeight(80)
+        self.setSizePolicy(QSizePolicy.Expanding, QSizePolicy.Expanding)
+
+    def set_samples(self, samples, now):
+        """
+        Args:
+            samples - list of (time, min, max) samples, oldest first
+            now - time.monotonic() time of right edge of plot
+        """
+        self._samples = samples
+        self._now = now
+        self.update()
+
+    def _columns(self, width):
+        start = self._now - self.duration
+        columns = OrderedDict()
+        for timestamp, low, high in self._samples:
+            x = int((timestamp - start) * (width - 1) / self.duration)
+            if x < 0 or x >= width:
+                continue
+            column = columns.get(x)
+            if column is None:
+                columns[x] = [low, high]
+            else:
+                column[0] = min(column[0], low)
+                column[1] = max(column[1], high)
+        return columns
+
+    def paintEvent(self, event):
+        painter = QPainter(self)
+        painter.fillRect(self.rect(), Qt.white)
+        painter.setPen(QPen(Qt.gray))
+        painter.drawRect(0, 0, self.width() - 1, self.height() - 1)
+        painter.setPen(QPen(Qt.black))
+        painter.drawText(self.MARGIN, 14, self.title)
+
+        columns = self._columns(self.width())
+        if not columns:
+            return
+
+        low = min(column[0] for column in columns.values())
+        high = max(column[1] for column in columns.values())
+        if high == low:
+            low, high = low - 1, high + 1
+
+        top, bottom = 20, self.height() - self.MARGIN
+        scale = float(bottom - top) / (high - low)
+
+        def y(value):
+            return int(bottom - (value - low) * scale)
+
+        painter.drawText(self.width() - 60, 14, '%g' % high)
+        painter.drawText(self.width() - 60, bottom, '%g' % low)
+
+        painter.setPen(QPen(QColor(0, 90, 200)))
+        previous = None
+        for x, (column_low, column_high) in columns.items():
+            y_low, y_high = y(column_low), y(column_high)
+            if previous is not None:
+                painter.drawLine(previous[0], previous[1], x, y_high)
+            painter.drawLine(x, y_high, x, y_low)
+            previous = (x, y_low)
+
+
+class ServoPlots(QWidget):
+    """Scrolling telemetry plots of one servo."""
+    REFRESH_RATE = 10
+    FIELDS = [
+        ('position', 'Position'),
+        ('speed', 'Speed'),
+        ('voltage', 'Voltage'),
+        ('temperature', 'Temperature'),
+    ]
+    DURATIONS = [30, 120, 600, 1200]
+
+    def __init__(self, poller):
+        super(ServoPlots, self).__init__()
+        self._poller = poller
+        self._servo_id = None
+
+        loadUi('resources/ServoPlots.ui', self)
+
+        self._plots = OrderedDict()
+        for field, title in self.FIELDS:
+            self._plots[field] = TelemetryPlot(title, self)
+            self.plotsLayout.addWidget(self._plots[field])
+
+        self.windowCombo.currentIndexChanged.connect(self._on_window_changed)
+
+        self._timer = QTimer(self)
+        self._timer.timeout.connect(self._refresh)
+        self._timer.start(int(1000 / self.REFRESH_RATE))
+
+    def set_poller(self, poller):
+        self._poller = poller
+
+    def set_servo(self, servo_id):
+        self._servo_id = servo_id
+        if servo_id is None:
+            self.setWindowTitle('Servo Telemetry')
+        else:
+            self.setWindowTitle('Servo %d Telemetry' % servo_id)
+        self._refresh()
+
+    def _on_window_changed(self, index):
+        for plot in self._plots.values():
+            plot.duration = float(self.DURATIONS[index])
+        self._refresh()
+
+    def _refresh(self):
+        if not self.isVisible():
+            return
+
+        now = time.monotonic()
+        for field, plot in self._plots.items():
+            if self._poller is None or self._servo_id is None:
+                samples = []
+            else:
+                samples = self._poller.history(self._servo_id, field, now - plot.duration)
+            plot.set_samples(samples, now)
+
+
+class ServoCommandThread(QThread):
+    """Sends servo setpoints (positions, speeds, modes) from background
+    thread.
+
+    Only the latest submitted value of each setpoint is kept, so when
+    values change faster than MAX_RATE (e.g. while slider is dragged),
+    intermediate values are dropped instead of queueing up.
+    """
+    commandFailed = pyqtSignal(str)
+
+    MAX_RATE = 50
+
+    def __init__(self, controller):
+        super(ServoCommandThread, self).__init__()
+        self._controller = controller
+        self._condition = threading.Condition()
+        self._pending = OrderedDict()
+
+    def _submit(self, servo_id, command, *args):
+        with self._condition:
+            # Re-insert to keep setpoints in order they were last changed
+            self._pending.pop((servo_id, command), None)
+            self._pending[(servo_id, command)] = args
+            self._condition.notify()
+
+    def move(self, servo_id, position):
+        self._submit(servo_id, 'move', position)
+
+    def set_servo_mode(self, servo_id):
+        self._submit(servo_id, 'mode', 'set_servo_mode')
+
+    def set_motor_mode(self, servo_id, speed=0):
+        self._submit(servo_id, 'mode', 'set_motor_mode', speed)
+
+    def requestInterruption(self):
+        super(ServoCommandThread, self).requestInterruption()
+        with self._condition:
+            self._condition.notify()
+
+    def run(self):
+        interval = int(1000 / self.MAX_RATE)
+        while not self.isInterruptionRequested():
+            with self._condition:
+                while not self._pending and not self.isInterruptionRequested():
+                    self._condition.wait()
+                pending, self._pending = self._pending, OrderedDict()
+
+            for (servo_id, command), args in pending.items():
+                try:
+                    if command == 'move':
+                        self._controller.move(servo_id, *args)
+                    else:
+                        getattr(self._controller, args[0])(servo_id, *args[1:])
+                except (lewansoul_lx16a.TimeoutError, serial.SerialException) as e:
+                    self.commandFailed.emit(str(e))
+
+            self.msleep(interval)
 
 
 class Terminal(QWidget):
@@ -329,6 +706,8 @@ class Terminal(QWidget):
         self.refreshPortsButton.clicked.connect(self._refresh_ports)
         self.servoList.currentItemChanged.connect(lambda curItem, prevItem: self._on_servo_selected(curItem))
         self.scanServosButton.clicked.connect(self._scan_servos)
+        self.dashboardButton.clicked.connect(self._show_dashboard)
+        self.plotsButton.clicked.connect(self._show_plots)
 
         self.servoOrMotorSwitch.valueChanged.connect(self._on_servo_motor_switch)
         self.speedSlider.valueChanged.connect(self._on_speed_slider_change)
@@ -343,7 +722,10 @@ class Terminal(QWidget):
 
         self._servoScanThread = None
         self._servoReadConfigurationThread = None
-        self._servoStateMonitorThread = None
+        self._servoPollerThread = None
+        self._servoCommandThread = None
+        self._dashboard = None
+        self._plots = None
 
         self.connectionGroup.setEnabled(False)
 
@@ -371,6 +753,22 @@ class Terminal(QWidget):
         self._connect_to_port(self.portCombo.currentText())
 
     def _connect_to_port(self, device):
+        if self._servoCommandThread:
+            self._servoCommandThread.requestInterruption()
+            self._servoCommandThread.wait()
+            self._servoCommandThread = None
+
+        if self._servoPollerThread:
+            self._servoPollerThread.requestInterruption()
+            self._servoPollerThread.wait()
+            self._servoPollerThread = None
+
+        if self._dashboard:
+            self._dashboard.clear()
+
+        if self._plots:
+            self._plots.set_poller(None)
+
         if self.connection:
             self.connection.close()
             self.logger.info('Disconnected')
@@ -384,7 +782,18 @@ class Terminal(QWidget):
             self.logger.info('Connecting to port %s' % device)
             try:
                 self.connection = serial.Serial(device, 115200, timeout=1)
-                self.controller = lewansoul_lx16a.ServoController(self.connection, timeout=1)
+                self.controller = lewansoul_lx16a.ServoController(
+                    self.connection, timeout=1,
+                    cache=lewansoul_lx16a.ConfigurationCache(),
+                )
+                self._servoCommandThread = ServoCommandThread(self.controller)
+                self._servoCommandThread.commandFailed.connect(self._on_command_failed)
+                self._servoCommandThread.start()
+                self._servoPollerThread = ServoPollerThread(self.controller)
+                self._servoPollerThread.rowsChanged.connect(self._on_servo_rows_changed)
+                self._servoPollerThread.start()
+                if self._plots:
+                    self._plots.set_poller(self._servoPollerThread)
                 self.connectionGroup.setEnabled(True)
                 self.logger.info('Connected to {}'.format(device))
             except serial.serialutil.SerialException as e:
@@ -397,6 +806,9 @@ class Terminal(QWidget):
 
         def scanStarted():
             self.servoList.clear()
+            self._servoPollerThread.clear()
+            if self._dashboard:
+                self._dashboard.clear()
             self.scanServosButton.setText('Stop Scan')
             self.scanServosButton.setEnabled(True)
 
@@ -409,6 +821,7 @@ class Terminal(QWidget):
             item = QListWidgetItem('Servo ID=%s' % servoId)
             item.setData(Qt.UserRole, servoId)
             self.servoList.addItem(item)
+            self._servoPollerThread.add_servo(servoId)
 
         if not self._servoScanThread:
             self._servoScanThread = ServoScanThread(self.controller)
@@ -438,13 +851,8 @@ class Terminal(QWidget):
                 self.maxTemperature.setText(str(details.max_temperature))
                 self.positionOffset.setText(str(details.position_offset))
                 self._servo_initialization = True
-
-                if self._servoStateMonitorThread:
-                    self._servoStateMonitorThread.requestInterruption()
-
-                self._servoStateMonitorThread = ServoMonitorThread(self.servo)
-                self._servoStateMonitorThread.servoStateUpdated.connect(self._update_servo_state)
-                self._servoStateMonitorThread.start()
+                self._show_servo_row(details.servo_id,
+                                     self._servoPollerThread.row(details.servo_id))
 
             def servo_configuration_timeout():
                 self._on_servo_selected(None)
@@ -461,11 +869,6 @@ class Terminal(QWidget):
                 self._servoReadConfigurationThread.servoConfigurationTimeout.connect(servo_configuration_timeout)
                 self._servoReadConfigurationThread.start()
         else:
-            if self._servoStateMonitorThread:
-                self._servoStateMonitorThread.requestInterruption()
-                self._servoStateMonitorThread.wait()
-                self._servoStateMonitorThread = None
-
             if self._servoReadConfigurationThread:
                 self._servoReadConfigurationThread.requestInterruption()
                 self._servoReadConfigurationThread.wait()
@@ -484,6 +887,40 @@ class Terminal(QWidget):
 
             self.servoGroup.setEnabled(False)
 
+        if self._plots:
+            self._plots.set_servo(servo_id or None)
+
+    def _show_dashboard(self):
+        if self._dashboard is None:
+            self._dashboard = ServoDashboard()
+            if self._servoPollerThread:
+                self._dashboard.update_rows(self._servoPollerThread.rows())
+        self._dashboard.show()
+        self._dashboard.raise_()
+
+    def _show_plots(self):
+        if self._plots is None:
+            self._plots = ServoPlots(self._servoPollerThread)
+        self._plots.set_servo(self.servo.servo_id if self.servo else None)
+        self._plots.show()
+        self._plots.raise_()
+
+    def _on_servo_rows_changed(self, rows):
+        if self._dashboard and self._dashboard.isVisible():
+            self._dashboard.update_rows(rows)
+
+        if self.servo and self.servo.servo_id in rows:
+            self._show_servo_row(self.servo.servo_id, rows[self.servo.servo_id])
+
+    def _show_servo_row(self, servo_id, row):
+        if any(field not in row for field in ServoState._fields[1:]):
+            # Not all fields were polled yet
+            return
+
+        self._update_servo_state(ServoState(servo_id=servo_id, **{
+            field: row[field] for field in ServoState._fields[1:]
+        }))
+
     def _configure_servo_id(self):
         if not self.servo:
             return
@@ -492,8 +929,16 @@ class Terminal(QWidget):
         dialog.servoId = self.servo.get_servo_id()
         if dialog.exec_():
             self.logger.info('Setting servo ID to %d' % dialog.servoId)
+            old_servo_id = self.servo.servo_id
             self.servo.set_servo_id(dialog.servoId)
             self.servo = self.controller.servo(dialog.servoId)
+            if self._servoPollerThread and old_servo_id != dialog.servoId:
+                self._servoPollerThread.remove_servo(old_servo_id)
+                self._servoPollerThread.add_servo(dialog.servoId)
+                if self._dashboard:
+                    self._dashboard.remove_row(old_servo_id)
+            if self._plots:
+                self._plots.set_servo(dialog.servoId)
             self.servoIdLabel.setText(str(dialog.servoId))
             item = self.servoList.currentItem()
             if item is not None:
@@ -548,48 +993,57 @@ class Terminal(QWidget):
         else:
             self.servo.set_position_offset(old_position_offset)
 
+    def _on_command_failed(self, message):
+        self.logger.error('Failed to send servo command: %s' % message)
+
     def _on_servo_motor_switch(self, value):
-        try:
-            if value == 0:
-                self.servoOrMotorModeUi.setCurrentIndex(0)
-                self.servo.set_servo_mode()
-            else:
-                self.servoOrMotorModeUi.setCurrentIndex(1)
-                self.servo.set_motor_mode()
-        except lewansoul_lx16a.TimeoutError:
-            QMessageBox.critical(self, "Timeout", "Timeout changing motor mode")
+        if not self.servo:
+            return
+
+        if value == 0:
+            self.servoOrMotorModeUi.setCurrentIndex(0)
+            self._servoCommandThread.set_servo_mode(self.servo.servo_id)
+        else:
+            self.servoOrMotorModeUi.setCurrentIndex(1)
+            self._servoCommandThread.set_motor_mode(self.servo.servo_id)
+
+    def _set_speed(self, speed):
+        if not self.servo:
+            return
+
+        self.logger.info('Setting motor speed to %d' % speed)
+        self._servoCommandThread.set_motor_mode(self.servo.servo_id, speed)
 
     def _on_speed_slider_change(self, speed):
-        try:
-            self.speedEdit.setValue(speed)
-            self.logger.info('Setting motor speed to %d' % speed)
-            self.servo.set_motor_mode(speed)
-        except lewansoul_lx16a.TimeoutError:
-            QMessageBox.critical(self, "Timeout", "Timeout updating motor speed")
+        self.speedEdit.blockSignals(True)
+        self.speedEdit.setValue(speed)
+        self.speedEdit.blockSignals(False)
+        self._set_speed(speed)
 
     def _on_speed_edit_change(self, speed):
-        try:
-            self.speedSlider.setValue(speed)
-            self.logger.info('Setting motor speed to %d' % speed)
-            self.servo.set_motor_mode(speed)
-        except lewansoul_lx16a.TimeoutError:
-            QMessageBox.critical(self, "Timeout", "Timeout updating motor speed")
+        self.speedSlider.blockSignals(True)
+        self.speedSlider.setValue(speed)
+        self.speedSlider.blockSignals(False)
+        self._set_speed(speed)
+
+    def _set_position(self, position):
+        if not self.servo:
+            return
+
+        self.logger.info('Setting servo position to %d' % position)
+        self._servoCommandThread.move(self.servo.servo_id, position)
 
     def _on_position_slider_change(self, position):
-        try:
-            self.positionEdit.setValue(position)
-            self.logger.info('Setting servo position to %d' % position)
-            self.servo.move(position)
-        except lewansoul_lx16a.TimeoutError:
-            QMessageBox.critical(self, "Timeout", "Timeout setting servo position")
+        self.positionEdit.blockSignals(True)
+        self.positionEdit.setValue(position)
+        self.positionEdit.blockSignals(False)
+        self._set_position(position)
 
     def _on_position_edit_change(self, position):
-        try:
-            self.positionSlider.setValue(position)
-            self.logger.info('Setting servo position to %d' % position)
-            self.servo.move(position)
-        except lewansoul_lx16a.TimeoutError:
-            QMessageBox.critical(self, "Timeout", "Timeout setting servo position")
+        self.positionSlider.blockSignals(True)
+        self.positionSlider.setValue(position)
+        self.positionSlider.blockSignals(False)
+        self._set_position(position)
 
     def _on_motor_on_button(self):
         if not self.servo:
@@ -638,14 +1092,7 @@ class Terminal(QWidget):
         self.motorOnButton.setChecked(servo_state.motor_on)
         self.ledOnButton.setChecked(servo_state.led_on)
         if servo_state.led_errors:
-            messages = []
-            if lewansoul_lx16a.SERVO_ERROR_OVER_TEMPERATURE | servo_state.led_errors:
-                messages.append('Overheating')
-            if lewansoul_lx16a.SERVO_ERROR_OVER_VOLTAGE | servo_state.led_errors:
-                messages.append('Voltage is out of limits')
-            if lewansoul_lx16a.SERVO_ERROR_LOCKED_ROTOR | servo_state.led_errors:
-                messages.append('Locked rotor')
-            self.ledErrors.setText('\n'.join(messages))
+            self.ledErrors.setText('\n'.join(format_led_errors(servo_state.led_errors)))
             self.clearLedErrorsButton.setEnabled(True)
         else:
             self.ledErrors.setText('')
@@ -673,10 +1120,21 @@ class Terminal(QWidget):
             self._servoReadConfigurationThread.wait()
             self._servoReadConfigurationThread = None
 
-        if self._servoStateMonitorThread:
-            self._servoStateMonitorThread.requestInterruption()
-            self._servoStateMonitorThread.wait()
-            self._servoStateMonitorThread = None
+        if self._servoPollerThread:
+            self._servoPollerThread.requestInterruption()
+            self._servoPollerThread.wait()
+            self._servoPollerThread = None
+
+        if self._dashboard:
+            self._dashboard.close()
+
+        if self._plots:
+            self._plots.close()
+
+        if self._servoCommandThread:
+            self._servoCommandThread.requestInterruption()
+            self._servoCommandThread.wait()
+            self._servoCommandThread = None
 
         if self.connection:
             self.connection.close()
@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+"""
+Throughput and latency benchmarks of servo controllers hot paths
+running against simulated servo bus.
+
+Usage:
+    python benchmarks/benchmark.py [--baudrate 115200] [--iterations 2000]
+
+Use `--baudrate 0` to make simulated data transfer instant and measure
+pure library overhead.
+"""
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import lewansoul_lx16a
+import lewansoul_lx16a_controller
+from lewansoul_lx16a_sim import SimulatedServo, SimulatedBus, SimulatedControllerBoard
+
+
+SERVO_IDS = list(range(1, 19))
+
+
+class NullSerial(object):
+    """Serial port discarding written data, used to measure frame
+    encoding cost alone."""
+    in_waiting = 0
+    timeout = None
+
+    def write(self, data):
+        return len(data)
+
+    def read(self, size=1):
+        return b''
+
+
+def percentile(values, p):
+    values = sorted(values)
+    if not values:
+        return 0.0
+    return values[min(len(values) - 1, int(len(values) * p / 100.0))]
+
+
+def run(name, func, iterations, packets_per_call=1):
+    # Warm up
+    for _ in range(min(iterations // 10, 100)):
+        func()
+
+    latencies = []
+    wall_start = time.perf_counter()
+    cpu_start = time.process_time()
+    for _ in range(iterations):
+        start = time.perf_counter()
+        func()
+        latencies.append(time.perf_counter() - start)
+    cpu = time.process_time() - cpu_start
+    wall = time.perf_counter() - wall_start
+
+    packets = iterations * packets_per_call
+    print('%-44s %10.0f %10.1f %10.1f %10.1f' % (
+        name,
+        iterations / wall,
+        percentile(latencies, 50) * 1e6,
+        percentile(latencies, 99) * 1e6,
+        cpu / packets * 1e6,
+    ))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--baudrate', type=int, default=0,
+                        help='simulated baud rate (0 for instant transfer)')
+    parser.add_argument('--latency', type=float, default=0.0,
+                        help='simulated servo response latency in seconds')
+    parser.add_argument('--iterations', type=int, default=2000)
+    args = parser.parse_args()
+
+    def make_bus():
+        return SimulatedBus(
+            [SimulatedServo(servo_id) for servo_id in SERVO_IDS],
+            baudrate=args.baudrate or None, latency=args.latency,
+        )
+
+    print('%-44s %10s %10s %10s %10s' % (
+        'benchmark', 'calls/s', 'p50 us', 'p99 us', 'cpu us/pkt',
+    ))
+
+    null_controller = lewansoul_lx16a.ServoController(NullSerial())
+    run('encode_packet', lambda: lewansoul_lx16a.encode_packet(1, 1, 244, 1, 0, 0),
+        args.iterations)
+    run('ServoController.move (null port)', lambda: null_controller.move(1, 500, 100),
+        args.iterations)
+    run('ServoController.motor_on (null port)', lambda: null_controller.motor_on(1),
+        args.iterations)
+    moves = {servo_id: (500, 100) for servo_id in SERVO_IDS}
+    run('ServoController.move_many(18) (null port)',
+        lambda: null_controller.move_many(moves),
+        args.iterations, packets_per_call=len(SERVO_IDS) + 1)
+
+    controller = lewansoul_lx16a.ServoController(make_bus())
+    run('ServoController._query', lambda: controller._query(1, lewansoul_lx16a.SERVO_POS_READ),
+        args.iterations, packets_per_call=2)
+    run('ServoController.get_position', lambda: controller.get_position(1),
+        args.iterations, packets_per_call=2)
+    run('ServoController.move', lambda: controller.move(1, 500, 100),
+        args.iterations)
+    run('ServoController.get_positions(18)', lambda: controller.get_positions(SERVO_IDS),
+        max(1, args.iterations // len(SERVO_IDS)), packets_per_call=2 * len(SERVO_IDS))
+    run('ServoController.move_many(18)', lambda: controller.move_many(moves),
+        args.iterations, packets_per_call=len(SERVO_IDS) + 1)
+
+    board = SimulatedControllerBoard(
+        [SimulatedServo(servo_id) for servo_id in SERVO_IDS],
+        baudrate=args.baudrate or None, latency=args.latency,
+    )
+    board_controller = lewansoul_lx16a_controller.ServoController(board)
+    run('controller.ServoController.get_positions(18)',
+        lambda: board_controller.get_positions(SERVO_IDS),
+        args.iterations, packets_per_call=2)
+    board_moves = {servo_id: 500 for servo_id in SERVO_IDS}
+    run('controller.ServoController.move(18)',
+        lambda: board_controller.move(board_moves, 100),
+        args.iterations)
+
+
+if __name__ == '__main__':
+    main()
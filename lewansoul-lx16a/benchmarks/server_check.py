@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+"""
+End to end check of bus server and remote controller running on
+localhost against simulated servo bus.
+
+Usage:
+    python benchmarks/server_check.py [--servos 6] [--unix]
+
+Starts `BusServer` on a free TCP port (or on a Unix socket with
+`--unix`), then exercises queries, commands, batches, telemetry
+subscriptions, a query to a missing servo and a bus scan running
+concurrently with another client's requests. Exits with non-zero status if any check fails.
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import lewansoul_lx16a
+from lewansoul_lx16a_server import BusServer, RemoteServoController
+from lewansoul_lx16a_sim import SimulatedServo, SimulatedBus
+
+
+def check(condition, message):
+    print('%-50s %s' % (message, 'ok' if condition else 'FAILED'))
+    if not condition:
+        check.failed = True
+
+check.failed = False
+
+
+def check_queries(controller, servo_ids):
+    check(controller.get_position(servo_ids[0]) == 500, 'get_position')
+    check(controller.get_positions(servo_ids) == {
+        servo_id: 500 for servo_id in servo_ids
+    }, 'get_positions')
+    check(controller.get_position_limits(servo_ids[0]) == (0, 1000),
+          'get_position_limits')
+
+    try:
+        controller.get_position(200, timeout=0.05)
+    except lewansoul_lx16a.TimeoutError:
+        check(True, 'missing servo timeout')
+    else:
+        check(False, 'missing servo timeout')
+
+
+def check_commands(controller, server, servo_ids):
+    controller.led_off(servo_ids[0])
+    check(controller.is_led_on(servo_ids[0]) is False, 'command before query')
+
+    rounds = server.rounds
+    with controller.batch():
+        for servo_id in servo_ids:
+            controller.led_on(servo_id)
+        with controller.batch():
+            controller.motor_off(servo_ids[0])
+    check(all(controller.is_led_on(servo_id) for servo_id in servo_ids),
+          'batch')
+    # Whole batch is executed in one round (possibly together with
+    # following query), then at most one round per query
+    check(server.rounds - rounds <= 1 + len(servo_ids), 'batch in one round')
+
+    with controller.batch():
+        controller.led_off(servo_ids[0])
+        led_on = controller.is_led_on(servo_ids[0])
+    check(led_on is False, 'query inside batch')
+
+
+def check_missing_servo(address, controller, servo_ids):
+    """Checks that query waiting for missing servo does not hold back
+    other client's commands and queries."""
+    errors = []
+
+    def query():
+        try:
+            controller.get_position(200, timeout=1)
+        except lewansoul_lx16a.TimeoutError as e:
+            errors.append(e)
+
+    with RemoteServoController(address) as other:
+        other.get_position(servo_ids[-1])
+        thread = threading.Thread(target=query)
+        thread.start()
+        time.sleep(0.05)
+        start = time.perf_counter()
+        other.move(servo_ids[-1], 500)
+        other.get_position(servo_ids[-1])
+        duration = time.perf_counter() - start
+        thread.join()
+
+    check(len(errors) == 1, 'missing servo query times out')
+    check(duration < 0.2, 'other client during missing servo query (%.1f ms)' % (
+        1000 * duration))
+
+
+def check_scan(address, controller, servo_ids):
+    latencies = []
+    done = threading.Event()
+
+    def poll():
+        with RemoteServoController(address) as other:
+            while not done.is_set():
+                start = time.perf_counter()
+                other.move(servo_ids[-1], 500)
+                other.get_position(servo_ids[-1])
+                latencies.append(time.perf_counter() - start)
+
+    thread = threading.Thread(target=poll)
+    thread.start()
+    start = time.perf_counter()
+    try:
+        found = controller.scan(hints=servo_ids[:1])
+    finally:
+        done.set()
+        thread.join()
+    duration = time.perf_counter() - start
+
+    check(sorted(found) == servo_ids, 'scan')
+    check(latencies and max(latencies) < duration / 4,
+          'queries during scan (max %.1f ms, scan %.2f s)' % (
+              1000 * max(latencies or [0]), duration))
+
+
+def check_subscribe(controller, servo_ids):
+    snapshots = []
+    received = threading.Event()
+
+    def on_snapshot(snapshot):
+        snapshots.append(snapshot)
+        received.set()
+
+    controller.subscribe(on_snapshot, servo_ids=servo_ids[:2])
+    received.wait(2)
+    check(bool(snapshots) and set(snapshots[0].values) <= set(servo_ids[:2]),
+          'subscribe')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--servos', type=int, default=6)
+    parser.add_argument('--unix', action='store_true',
+                        help='listen on Unix socket instead of TCP port')
+    args = parser.parse_args()
+
+    servo_ids = list(range(1, args.servos + 1))
+    bus = SimulatedBus([SimulatedServo(servo_id) for servo_id in servo_ids])
+    controller = lewansoul_lx16a.ServoController(bus, timeout=0.5)
+
+    tmpdir = tempfile.mkdtemp() if args.unix else None
+    address = os.path.join(tmpdir, 'lx16a.sock') if args.unix else ('127.0.0.1', 0)
+    server = BusServer(controller, address, rates={'position': 10})
+    server.start()
+    try:
+        address = server.address
+        with RemoteServoController(address) as remote:
+            check_queries(remote, servo_ids)
+            check_commands(remote, server, servo_ids)
+            check_missing_servo(address, remote, servo_ids)
+            check_scan(address, remote, servo_ids)
+            check_subscribe(remote, servo_ids)
+    finally:
+        server.stop()
+        if tmpdir is not None:
+            if os.path.exists(address):
+                os.unlink(address)
+            os.rmdir(tmpdir)
+
+    sys.exit(1 if check.failed else 0)
+
+
+if __name__ == '__main__':
+    main()
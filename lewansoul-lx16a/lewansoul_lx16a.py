@@ -1,17 +1,40 @@
 __all__ = [
     'ServoController',
+    'PacketDecoder',
+    'RetryPolicy',
+    'CancellationToken',
+    'CancelledError',
+    'ConfigurationCache',
+    'BusScheduler',
+    'ControllerStats',
+    'format_prometheus',
+    'ticks_to_degrees',
+    'degrees_to_ticks',
     'TimeoutError',
 
     'SERVO_ERROR_OVER_TEMPERATURE',
     'SERVO_ERROR_OVER_VOLTAGE',
     'SERVO_ERROR_LOCKED_ROTOR',
+
+    'PRIORITY_EMERGENCY',
+    'PRIORITY_MOTION',
+    'PRIORITY_CONFIG',
+    'PRIORITY_TELEMETRY',
 ]
 
 
 from serial.serialutil import Timeout
 from functools import partial
+from bisect import bisect_left
+from collections import deque, Counter
+from contextlib import contextmanager
+from itertools import chain
+import concurrent.futures
 import threading
 import logging
+import random
+import struct
+import time
 
 
 SERVO_ID_ALL = 0xfe
@@ -51,6 +74,55 @@ SERVO_ERROR_OVER_VOLTAGE = 2
 SERVO_ERROR_LOCKED_ROTOR = 4
 
 
+# Servo positions 0-1000 cover 240 degrees of rotation
+CENTER_POSITION = 500
+TICKS_PER_DEGREE = 1000 / 240.0
+
+
+# Bus access priority classes, lower value wins
+PRIORITY_EMERGENCY = 0
+PRIORITY_MOTION = 1
+PRIORITY_CONFIG = 2
+PRIORITY_TELEMETRY = 3
+
+PRIORITY_NAMES = ('emergency', 'motion', 'config', 'telemetry')
+
+COMMAND_PRIORITIES = {
+    SERVO_MOVE_STOP: PRIORITY_EMERGENCY,
+    SERVO_LOAD_OR_UNLOAD_WRITE: PRIORITY_EMERGENCY,
+    SERVO_MOVE_TIME_WRITE: PRIORITY_MOTION,
+    SERVO_MOVE_TIME_WAIT_WRITE: PRIORITY_MOTION,
+    SERVO_MOVE_START: PRIORITY_MOTION,
+    SERVO_OR_MOTOR_MODE_WRITE: PRIORITY_MOTION,
+    SERVO_TEMP_READ: PRIORITY_TELEMETRY,
+    SERVO_VIN_READ: PRIORITY_TELEMETRY,
+    SERVO_POS_READ: PRIORITY_TELEMETRY,
+    SERVO_OR_MOTOR_MODE_READ: PRIORITY_TELEMETRY,
+    SERVO_LOAD_OR_UNLOAD_READ: PRIORITY_TELEMETRY,
+    SERVO_LED_CTRL_READ: PRIORITY_TELEMETRY,
+    SERVO_LED_ERROR_READ: PRIORITY_TELEMETRY,
+}
+
+# Length field values of responses to read commands
+# (requests have length 3)
+RESPONSE_LENGTHS = {
+    SERVO_MOVE_TIME_READ: 7,
+    SERVO_MOVE_TIME_WAIT_READ: 7,
+    SERVO_ID_READ: 4,
+    SERVO_ANGLE_OFFSET_READ: 4,
+    SERVO_ANGLE_LIMIT_READ: 7,
+    SERVO_VIN_LIMIT_READ: 7,
+    SERVO_TEMP_MAX_LIMIT_READ: 4,
+    SERVO_TEMP_READ: 4,
+    SERVO_VIN_READ: 5,
+    SERVO_POS_READ: 5,
+    SERVO_OR_MOTOR_MODE_READ: 7,
+    SERVO_LOAD_OR_UNLOAD_READ: 4,
+    SERVO_LED_CTRL_READ: 4,
+    SERVO_LED_ERROR_READ: 4,
+}
+
+
 def lower_byte(value):
     return int(value) % 256
 
@@ -67,13 +139,139 @@ def clamp(range_min, range_max, value):
     return min(range_max, max(range_min, value))
 
 
+def _decode_byte(response):
+    return response[2]
+
+
+def _decode_words(response):
+    return word(response[2], response[3]), word(response[4], response[5])
+
+
+def _decode_position_offset(response):
+    deviation = response[2]
+    if deviation > 127:
+        deviation -= 256
+    return deviation
+
+
+def _encode_position_offset(deviation):
+    return deviation + 256 if deviation < 0 else deviation
+
+
+def _decode_temperature(response):
+    return response[2]
+
+
+def _decode_voltage(response):
+    return word(response[2], response[3])
+
+
+def _decode_position(response):
+    position = word(response[2], response[3])
+    if position > 32767:
+        position -= 65536
+    return position
+
+
+def _decode_mode(response):
+    return response[2]
+
+
+def _decode_motor_speed(response):
+    if response[2] != 1:
+        return 0
+    speed = word(response[4], response[5])
+    if speed > 32767:
+        speed -= 65536
+    return speed
+
+
+def _decode_motor_on(response):
+    return response[2] == 1
+
+
+def _decode_led_on(response):
+    return response[2] == 0
+
+
+def _decode_led_errors(response):
+    return response[2]
+
+
+def encode_packet(servo_id, command, *params):
+    """Returns servo command packet as bytearray."""
+    length = 3 + len(params)
+    checksum = 255-((servo_id + length + command + sum(params)) % 256)
+    return bytearray([0x55, 0x55, servo_id, length, command, *params, checksum])
+
+
+def ticks_to_degrees(positions, offsets=0):
+    """Converts servo positions to degrees from center position.
+
+    Works with numbers as well as NumPy arrays (element-wise).
+
+    Args:
+        positions - position or array of positions in ticks
+        offsets - position offset or array of per-servo position offsets
+            in ticks (e.g. calibration offsets) to subtract
+    """
+    return (positions - CENTER_POSITION - offsets) / TICKS_PER_DEGREE
+
+
+def degrees_to_ticks(angles, offsets=0):
+    """Converts angles in degrees from center position to servo positions.
+
+    Inverse of `ticks_to_degrees`. Result is not rounded or clamped.
+    """
+    return angles * TICKS_PER_DEGREE + CENTER_POSITION + offsets
+
+
 class TimeoutError(RuntimeError):
     pass
 
 
+class CancelledError(RuntimeError):
+    pass
+
+
 LOGGER = logging.getLogger('lewansoul.servos.lx16a')
 
 
+# Header, servo ID, length, command, byte parameters, checksum
+# (indexed by number of parameters)
+_PACKETS = tuple(struct.Struct('<%dB' % (6 + count)) for count in range(5))
+# Header, servo ID, length, command, two word parameters, checksum
+_WORDS_PACKET = struct.Struct('<BBBBBHHB')
+# Header, servo ID, length, command, position, time, checksum
+_MOVE_PACKET = _WORDS_PACKET
+_MOVE_START_PACKET = encode_packet(SERVO_ID_ALL, SERVO_MOVE_START)
+
+
+def _packet_fields(servo_id, command, params):
+    """Returns `_PACKETS[len(params)]` fields of packet with byte parameters."""
+    count = len(params)
+    checksum = 255 - (servo_id + 3 + count + command + sum(params)) % 256
+    return (0x55, 0x55, servo_id, 3 + count, command, *params, checksum)
+
+
+def _words_fields(servo_id, command, first, second):
+    """Returns `_WORDS_PACKET` fields of packet with two 16-bit parameters."""
+    first = int(first) & 0xffff
+    second = int(second) & 0xffff
+    checksum = 255 - (
+        servo_id + 7 + command +
+        (first & 0xff) + (first >> 8) + (second & 0xff) + (second >> 8)
+    ) % 256
+    return (0x55, 0x55, servo_id, 7, command, first, second, checksum)
+
+
+def _is_response(packet):
+    """Returns True if packet length matches response to its command,
+    e.g. packet is not an echo of a query."""
+    length = packet[3]
+    return length > 3 and length == RESPONSE_LENGTHS.get(packet[4], length)
+
+
 class Servo(object):
     def __init__(self, controller, servo_id):
         self.__dict__.update({
@@ -91,219 +289,1689 @@ class Servo(object):
         return attr
 
 
-class ServoController(object):
-    def __init__(self, serial, timeout=1):
-        self._serial = serial
-        self._timeout = timeout
-        self._lock = threading.RLock()
-
-    def _command(self, servo_id, command, *params):
-        length = 3 + len(params)
-        checksum = 255-((servo_id + length + command + sum(params)) % 256)
-        LOGGER.debug('Sending servo control packet: %s', [
-            0x55, 0x55, servo_id, length, command, *params, checksum
-        ])
+class PacketDecoder(object):
+    """Incremental decoder of servo bus packets.
+
+    Data read from serial port is fed into decoder's buffer. Decoder
+    resynchronizes on packet header, validates packet length and checksum
+    and yields complete packets. Incomplete trailing data is kept in the
+    buffer until more data is fed.
+    """
+    HEADER = b'\x55\x55'
+    LENGTH_OFFSET = 3
+    MIN_LENGTH = 3
+    MAX_LENGTH = 7
+    CHECKSUM = True
+
+    def __init__(self):
+        self._buffer = bytearray()
+        self.skipped_bytes = 0
+        self.checksum_errors = 0
+
+    def __len__(self):
+        return len(self._buffer)
+
+    def feed(self, data):
+        self._buffer += data
+
+    def reset(self):
+        del self._buffer[:]
+
+    def bytes_needed(self, length=None):
+        """Returns minimum number of bytes required to complete next packet.
+
+        Args:
+            length - expected length field of next packet (if known)
+        """
+        offset = self.LENGTH_OFFSET
+        size = len(self._buffer)
+        if size <= offset:
+            return offset + (length or self.MIN_LENGTH) - size
+        return max(1, offset + self._buffer[offset] - size)
+
+    def _skip(self, count):
+        self.skipped_bytes += count
+        del self._buffer[:count]
+
+    def decode(self):
+        """Yields complete packets (as bytes) available in buffer."""
+        buf = self._buffer
+        offset = self.LENGTH_OFFSET
+
+        while buf:
+            start = buf.find(self.HEADER)
+            if start < 0:
+                # Keep last octet in case it is a start of next header
+                self._skip(len(buf) - (1 if buf[-1] == self.HEADER[0] else 0))
+                return
+            if start > 0:
+                self._skip(start)
+
+            if len(buf) <= offset:
+                return
+
+            length = buf[offset]
+            if length < self.MIN_LENGTH or length > self.MAX_LENGTH:
+                LOGGER.error('Invalid length for packet %s', list(buf[:offset+1]))
+                self._skip(1)
+                continue
+
+            size = offset + length
+            if len(buf) < size:
+                return
+
+            packet = bytes(buf[:size])
+            if self.CHECKSUM and 255 - sum(packet[2:-1]) % 256 != packet[-1]:
+                LOGGER.error('Invalid checksum for packet %s', list(packet))
+                self.checksum_errors += 1
+                self._skip(1)
+                continue
+
+            del buf[:size]
+            yield packet
+
+
+class ConfigurationCache(object):
+    """Cache of servo configuration registers (ID, position offset,
+    position, voltage and temperature limits).
+
+    Values are stored when read from servo and updated by corresponding
+    setters. Entries expire after `ttl` seconds (never if `ttl` is None).
+    """
+
+    def __init__(self, ttl=None):
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def get(self, servo_id, name):
+        """Returns cached value or raises KeyError if there is no valid value."""
+        with self._lock:
+            entry = self._entries.get((servo_id, name))
+            if entry is not None:
+                value, expires_at = entry
+                if expires_at is None or expires_at > time.monotonic():
+                    self.hits += 1
+                    return value
+                del self._entries[(servo_id, name)]
+
+            self.misses += 1
+            raise KeyError((servo_id, name))
+
+    def put(self, servo_id, name, value):
+        expires_at = None if self.ttl is None else time.monotonic() + self.ttl
         with self._lock:
-            self._serial.write(bytearray([
-                0x55, 0x55, servo_id, length, command, *params, checksum
-            ]))
+            if servo_id == SERVO_ID_ALL:
+                # Broadcast write: value of every servo has changed
+                for key in [key for key in self._entries if key[1] == name]:
+                    del self._entries[key]
+                return
 
-    def _wait_for_response(self, servo_id, command, timeout=None):
-        timeout = Timeout(timeout or self._timeout)
+            self._entries[(servo_id, name)] = (value, expires_at)
+
+    def invalidate(self, servo_id=None, name=None):
+        """Removes cached values of given servo and/or register
+        (or all values if neither is specified)."""
+        with self._lock:
+            for key in list(self._entries):
+                if servo_id not in (None, SERVO_ID_ALL, key[0]):
+                    continue
+                if name is not None and key[1] != name:
+                    continue
+                del self._entries[key]
+
+    def rename(self, servo_id, new_servo_id):
+        """Moves cached values of servo to a new servo ID."""
+        with self._lock:
+            for key in list(self._entries):
+                if key[0] == new_servo_id:
+                    del self._entries[key]
+            for key in list(self._entries):
+                if key[0] == servo_id:
+                    self._entries[(new_servo_id, key[1])] = self._entries.pop(key)
+
+    def stats(self):
+        return {'hits': self.hits, 'misses': self.misses, 'size': len(self._entries)}
+
+
+class Histogram(object):
+    """Fixed-bucket histogram of durations in seconds."""
+    BUCKETS = (0.0005, 0.001, 0.002, 0.005, 0.01, 0.02, 0.05, 0.1, 0.2, 0.5, 1.0, 2.0)
+
+    def __init__(self):
+        self.counts = [0] * (len(self.BUCKETS) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.BUCKETS, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def snapshot(self):
+        """Returns dict with count, sum and list of (upper bound, cumulative
+        count) bucket tuples."""
+        buckets = []
+        total = 0
+        for bound, count in zip(self.BUCKETS + (float('inf'),), self.counts):
+            total += count
+            buckets.append((bound, total))
+        return {'count': self.count, 'sum': self.sum, 'buckets': buckets}
+
+
+class ControllerStats(object):
+    """Servo controller performance counters and histograms."""
+
+    def __init__(self):
+        self.queries = 0
+        self.timeouts = Counter()
+        self.bytes_sent = 0
+        self.bytes_received = 0
+        self.latency_by_command = {}
+        self.latency_by_servo = {}
+        self.lock_wait = Histogram()
+
+    def observe_query(self, servo_id, command, latency):
+        self.queries += 1
+
+        histogram = self.latency_by_command.get(command)
+        if histogram is None:
+            histogram = self.latency_by_command[command] = Histogram()
+        histogram.observe(latency)
+
+        if servo_id is not None:
+            histogram = self.latency_by_servo.get(servo_id)
+            if histogram is None:
+                histogram = self.latency_by_servo[servo_id] = Histogram()
+            histogram.observe(latency)
+
+    def snapshot(self):
+        return {
+            'queries': self.queries,
+            'timeouts': sum(self.timeouts.values()),
+            'timeouts_by_command': dict(self.timeouts),
+            'bytes_sent': self.bytes_sent,
+            'bytes_received': self.bytes_received,
+            'latency_by_command': {
+                command: histogram.snapshot()
+                for command, histogram in self.latency_by_command.items()
+            },
+            'latency_by_servo': {
+                servo_id: histogram.snapshot()
+                for servo_id, histogram in self.latency_by_servo.items()
+            },
+            'lock_wait': self.lock_wait.snapshot(),
+        }
+
+
+class BusScheduler(object):
+    """Reentrant bus lock granting access by priority class.
+
+    When bus is released, it is handed over to the longest waiting
+    thread of the highest priority class (see PRIORITY_* constants), so
+    e.g. a move does not wait for queued telemetry queries. Threads of
+    the same class are served in FIFO order.
+
+    Bus owner can check `should_yield()` to give up bus early (e.g.
+    `ServoController` stops waiting for overdue query responses when
+    commands of higher priority class are waiting).
+    """
+
+    def __init__(self):
+        self._mutex = threading.Lock()
+        self._owner = None
+        self._count = 0
+        self._waiters = [deque() for _ in PRIORITY_NAMES]
+        self.acquisitions = [0] * len(PRIORITY_NAMES)
+        self.max_depth = [0] * len(PRIORITY_NAMES)
+        self.waits = [Histogram() for _ in PRIORITY_NAMES]
+
+    def acquire(self, priority=PRIORITY_CONFIG):
+        """Acquires bus, blocking until it is granted.
+
+        Returns:
+            time spent waiting in seconds
+        """
+        me = threading.get_ident()
+        with self._mutex:
+            if self._owner == me:
+                self._count += 1
+                return 0.0
+
+            self.acquisitions[priority] += 1
+            if self._owner is None:
+                self._owner = me
+                self._count = 1
+                self.waits[priority].observe(0.0)
+                return 0.0
+
+            grant = threading.Lock()
+            grant.acquire()
+            waiters = self._waiters[priority]
+            waiters.append((me, grant))
+            if len(waiters) > self.max_depth[priority]:
+                self.max_depth[priority] = len(waiters)
+
+        start = time.perf_counter()
+        # Released by the thread handing the bus over to us
+        grant.acquire()
+        wait = time.perf_counter() - start
+        with self._mutex:
+            self.waits[priority].observe(wait)
+        return wait
+
+    def release(self):
+        with self._mutex:
+            if self._owner != threading.get_ident():
+                raise RuntimeError('Cannot release bus not owned by current thread')
+
+            self._count -= 1
+            if self._count > 0:
+                return
+
+            self._owner = None
+            for waiters in self._waiters:
+                if waiters:
+                    self._owner, grant = waiters.popleft()
+                    self._count = 1
+                    grant.release()
+                    return
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *args):
+        self.release()
+
+    def depth(self, priority):
+        """Returns number of threads waiting for bus in given priority class."""
+        return len(self._waiters[priority])
+
+    def should_yield(self, priority):
+        """Returns True if bus is held by current thread (not reentrantly)
+        and threads of higher priority class than given are waiting for it."""
+        with self._mutex:
+            return (self._owner == threading.get_ident() and self._count == 1 and
+                    any(self._waiters[:priority]))
+
+    def stats(self):
+        """Returns dict mapping priority class name to dict with current
+        and maximum queue depth, number of acquisitions and wait time
+        histogram snapshot."""
+        with self._mutex:
+            return {
+                name: {
+                    'depth': len(self._waiters[priority]),
+                    'max_depth': self.max_depth[priority],
+                    'acquisitions': self.acquisitions[priority],
+                    'wait': self.waits[priority].snapshot(),
+                }
+                for priority, name in enumerate(PRIORITY_NAMES)
+            }
+
+
+def format_prometheus(stats, prefix='lx16a', labels=None):
+    """Formats controller stats snapshot (result of `ServoController.stats()`)
+    in Prometheus text exposition format.
+
+    Args:
+        stats - stats snapshot dict
+        prefix - metric name prefix
+        labels - optional dict of labels to add to all metrics
+    """
+    labels = labels or {}
+    lines = []
+
+    def format_labels(extra=None):
+        all_labels = dict(labels, **(extra or {}))
+        if not all_labels:
+            return ''
+        return '{%s}' % ','.join(
+            '%s="%s"' % (name, value) for name, value in sorted(all_labels.items())
+        )
+
+    def counter(name, value, help, extra=None):
+        lines.append('# HELP %s_%s %s' % (prefix, name, help))
+        lines.append('# TYPE %s_%s counter' % (prefix, name))
+        lines.append('%s_%s%s %s' % (prefix, name, format_labels(extra), value))
+
+    def histograms(name, help, values, label=None):
+        lines.append('# HELP %s_%s %s' % (prefix, name, help))
+        lines.append('# TYPE %s_%s histogram' % (prefix, name))
+        for key, histogram in values:
+            extra = {label: key} if label else {}
+            for bound, count in histogram['buckets']:
+                lines.append('%s_%s_bucket%s %d' % (
+                    prefix, name,
+                    format_labels(dict(extra, le='+Inf' if bound == float('inf') else repr(bound))),
+                    count,
+                ))
+            lines.append('%s_%s_sum%s %r' % (prefix, name, format_labels(extra), histogram['sum']))
+            lines.append('%s_%s_count%s %d' % (prefix, name, format_labels(extra), histogram['count']))
+
+    for name, help in [
+        ('checksum_errors', 'Number of received packets with invalid checksum'),
+        ('skipped_bytes', 'Number of bytes skipped while looking for packet header'),
+        ('unexpected_responses', 'Number of responses not matching any query'),
+        ('late_responses', 'Number of responses received after query timeout'),
+        ('collisions', 'Number of sent packets echoed back garbled'),
+        ('preemptions', 'Number of queries that gave up bus to higher priority commands'),
+        ('queries', 'Number of completed queries'),
+        ('bytes_sent', 'Number of bytes sent'),
+        ('bytes_received', 'Number of bytes received'),
+    ]:
+        if name in stats:
+            counter(name + '_total', stats[name], help)
+
+    if 'timeouts_by_command' in stats:
+        lines.append('# HELP %s_timeouts_total Number of timed out queries' % prefix)
+        lines.append('# TYPE %s_timeouts_total counter' % prefix)
+        for command, count in sorted(stats['timeouts_by_command'].items()):
+            lines.append('%s_timeouts_total%s %d' % (
+                prefix, format_labels({'command': command}), count,
+            ))
+
+    if 'latency_by_command' in stats:
+        histograms('query_latency_seconds', 'Query round trip time by command',
+                   sorted(stats['latency_by_command'].items()), 'command')
+    if 'latency_by_servo' in stats:
+        histograms('servo_query_latency_seconds', 'Query round trip time by servo',
+                   sorted(stats['latency_by_servo'].items()), 'servo')
+    if 'lock_wait' in stats:
+        histograms('lock_wait_seconds', 'Time spent waiting for bus lock',
+                   [(None, stats['lock_wait'])])
+    if 'scheduler' in stats:
+        scheduler = sorted(stats['scheduler'].items())
+        lines.append('# HELP %s_bus_queue_depth Number of threads waiting for bus' % prefix)
+        lines.append('# TYPE %s_bus_queue_depth gauge' % prefix)
+        for name, value in scheduler:
+            lines.append('%s_bus_queue_depth%s %d' % (
+                prefix, format_labels({'priority': name}), value['depth'],
+            ))
+        histograms('bus_wait_seconds', 'Time spent waiting for bus by priority class',
+                   [(name, value['wait']) for name, value in scheduler], 'priority')
+
+    return '\n'.join(lines) + '\n'
+
+
+class CancellationToken(object):
+    """Token used to cancel long running operations (e.g. retries or
+    queries waiting for response) from another thread."""
+
+    def __init__(self):
+        self._event = threading.Event()
+
+    @property
+    def cancelled(self):
+        return self._event.is_set()
+
+    def cancel(self):
+        self._event.set()
+
+    def wait(self, timeout=None):
+        """Waits for cancellation for given time.
+        Returns True if token was cancelled."""
+        return self._event.wait(timeout)
+
+    def raise_if_cancelled(self):
+        if self._event.is_set():
+            raise CancelledError()
+
+
+class RetryPolicy(object):
+    """Policy of retrying failed queries with exponential backoff.
+
+    Delay before n-th retry is `backoff * multiplier ** (n - 1)` (but not
+    more than `max_backoff`) randomized by +/- `jitter` fraction.
+    """
+
+    def __init__(self, attempts=3, backoff=0.05, multiplier=2.0, max_backoff=1.0,
+                 jitter=0.1, deadline=None, retry_on=(TimeoutError,)):
+        """
+        Args:
+            attempts - maximum number of attempts
+            backoff - delay before first retry in seconds
+            multiplier - backoff multiplier for each next retry
+            max_backoff - maximum delay between attempts in seconds
+            jitter - fraction of delay to randomize it by
+            deadline - total time limit for all attempts in seconds
+            retry_on - tuple of exception classes to retry on
+        """
+        self.attempts = attempts
+        self.backoff = backoff
+        self.multiplier = multiplier
+        self.max_backoff = max_backoff
+        self.jitter = jitter
+        self.deadline = deadline
+        self.retry_on = retry_on
+
+        self.retries = 0
+        self.failures = 0
+
+    def delay(self, retry):
+        """Returns delay in seconds before given retry (starting with 1)."""
+        delay = min(self.max_backoff, self.backoff * self.multiplier ** (retry - 1))
+        if self.jitter:
+            delay *= 1 + random.uniform(-self.jitter, self.jitter)
+        return max(0.0, delay)
+
+    def call(self, func, *args, timeout=None, cancel=None, on_retry=None):
+        """Calls function retrying it on failures.
+
+        Args:
+            func - function to call
+            args - function arguments
+            timeout - if not None, passed to function as `timeout` keyword
+                argument, limited by time left until deadline
+            cancel - optional CancellationToken to abort retries
+            on_retry - optional function called with exception before
+                each retry
+
+        Raises:
+            CancelledError if operation was cancelled
+        """
+        deadline = None
+        if self.deadline is not None:
+            deadline = time.monotonic() + self.deadline
+
+        attempt = 0
+        while True:
+            if cancel is not None:
+                cancel.raise_if_cancelled()
+
+            attempt += 1
+            kwargs = {}
+            if timeout is not None:
+                kwargs['timeout'] = timeout
+                if deadline is not None:
+                    kwargs['timeout'] = max(0.001, min(timeout, deadline - time.monotonic()))
+
+            try:
+                return func(*args, **kwargs)
+            except self.retry_on as e:
+                delay = self.delay(attempt)
+                if (attempt >= self.attempts or
+                        (deadline is not None and time.monotonic() + delay >= deadline)):
+                    self.failures += 1
+                    raise
+
+                self.retries += 1
+                if on_retry is not None:
+                    on_retry(e)
+
+            if cancel is not None:
+                if cancel.wait(delay):
+                    raise CancelledError()
+            else:
+                time.sleep(delay)
 
-        def read(size=1):
+
+class ServoController(object):
+    READER_POLL_INTERVAL = 0.05
+    CANCEL_POLL_INTERVAL = 0.01
+    SCAN_TIMEOUT = 0.1
+    # Query still waiting for response after PREEMPT_RTT_FACTOR average
+    # round trip times (but at least PREEMPT_MIN_TIMEOUT) times out early
+    # if commands of higher priority class are waiting for bus
+    PREEMPT_RTT_FACTOR = 4
+    PREEMPT_MIN_TIMEOUT = 0.01
+    # Responses to timed out queries are expected for LATE_RESPONSE_TTL
+    # seconds after timeout, later ones are counted as unexpected
+    LATE_RESPONSE_TTL = 1.0
+
+    def __init__(self, serial, timeout=1, cache=None, stats=False, capture=None,
+                 retry=None, flush_window=None, echo=False):
+        """
+        Args:
+            serial - serial port (e.g. serial.Serial instance)
+            timeout - default query timeout in seconds
+            cache - optional ConfigurationCache instance to cache
+                servo configuration registers
+            stats - if True, collect latency and traffic statistics
+                (see `stats()`)
+            capture - optional traffic recorder (e.g.
+                lewansoul_lx16a_capture.CaptureFile instance)
+            retry - default RetryPolicy for queries
+            flush_window - if not None, commands are buffered and sent
+                with a single write at most this many seconds after
+                the first buffered command (see also `batch()`)
+            echo - if True, serial adapter is expected to receive back
+                everything that is sent (e.g. one-wire half-duplex
+                adapters); echoed data is verified and discarded before
+                decoding responses, mismatches are counted as bus
+                collisions
+        """
+        self._serial = serial
+        self._timeout = timeout
+        self._lock = BusScheduler()
+        self._decoder = PacketDecoder()
+        self._frame = bytearray(_WORDS_PACKET.size)
+        self._frames = tuple(
+            memoryview(self._frame)[:packet.size] for packet in _PACKETS
+        )
+        self._move_buffer = bytearray()
+        self._tx_buffer = bytearray()
+        # Per thread batch depth and buffer (see `batch()`)
+        self._local = threading.local()
+        self.flush_window = flush_window
+        self._flusher = None
+        self._flush_event = threading.Event()
+        self._flush_deadline = 0
+        self.cache = cache
+        self._stats = ControllerStats() if stats else None
+        self.capture = capture
+
+        self._reader = None
+        self._reader_stop = threading.Event()
+        # (servo ID, command) -> deque of [deadline, future, send time]
+        self._pending = {}
+        self._pending_lock = threading.Lock()
+        # (servo ID, command) -> deque of times until which responses to
+        # timed out queries are expected
+        self._expired = {}
+        # Shortest round trip time seen by reader (None until measured)
+        self._min_rtt = None
+        self.unexpected_responses = 0
+        self.late_responses = 0
+
+        self.retry = retry
+        self.retries = 0
+
+        self.echo = echo
+        self._echo = bytearray()
+        self._echo_lock = threading.Lock()
+        self.collisions = 0
+
+        self._rtt = 0.0
+        self.preemptions = 0
+
+    def _acquire(self, priority=PRIORITY_CONFIG):
+        wait = self._lock.acquire(priority)
+        if self._stats is not None:
+            self._stats.lock_wait.observe(wait)
+
+    def _write(self, data):
+        """Writes data to serial port or appends it to current thread's
+        batch or flush window buffer. Must be called with lock held."""
+        batch = getattr(self._local, 'batch', None)
+        if batch is not None:
+            batch += data
+            return
+
+        if self.flush_window is None:
+            self._transmit(data)
+            return
+
+        if not self._tx_buffer:
+            self._schedule_flush()
+        self._tx_buffer += data
+
+    def _transmit(self, data):
+        if self.echo:
+            # Expect echo before writing, as background reader can
+            # receive it right away
+            with self._echo_lock:
+                self._echo += data
+        self._serial.write(data)
+        if self._stats is not None:
+            self._stats.bytes_sent += len(data)
+        if self.capture is not None:
+            self.capture.record_tx(data)
+
+    def _flush(self):
+        """Sends data buffered by flush window and by current thread's
+        batch. Must be called with lock held."""
+        batch = getattr(self._local, 'batch', None)
+        if batch:
+            self._tx_buffer += batch
+            del batch[:]
+        if self._tx_buffer:
+            self._transmit(self._tx_buffer)
+            del self._tx_buffer[:]
+
+    def flush(self):
+        """Sends commands buffered by flush window and by current
+        thread's `batch()`."""
+        self._acquire(PRIORITY_MOTION)
+        try:
+            self._flush()
+        finally:
+            self._lock.release()
+
+    @contextmanager
+    def hold_bus(self, priority=PRIORITY_CONFIG):
+        """Returns context manager holding bus exclusively, e.g. to hold
+        several buses at once (see `ServoBusGroup.move_start`).
+
+        Data buffered by flush window is sent on entry. Controller
+        methods can be called inside.
+
+        Args:
+            priority - priority class to acquire bus with
+        """
+        self._acquire(priority)
+        try:
+            self._flush()
+            yield self
+        finally:
+            self._lock.release()
+
+    def write_frames(self, data, priority=PRIORITY_CONFIG):
+        """Writes pre-encoded packets (e.g. made with `encode_packet`)
+        right away, bypassing batches and flush window.
+
+        Args:
+            data - bytes of one or more packets
+            priority - priority class to acquire bus with
+        """
+        self._acquire(priority)
+        try:
+            self._flush()
+            if LOGGER.isEnabledFor(logging.DEBUG):
+                LOGGER.debug('Sending servo control packets: %s', list(data))
+            self._transmit(data)
+        finally:
+            self._lock.release()
+
+    @contextmanager
+    def batch(self):
+        """Returns context manager that buffers commands sent inside it
+        and sends them with a single write on exit.
+
+        Buffer is also flushed before any query (together with query
+        packet) and on emergency commands (e.g. `move_stop`). Batches
+        can be nested, buffer is flushed when outermost batch exits.
+
+        Batches are per thread: commands sent by other threads (and the
+        flush window) are not held back by an open batch.
+
+        Example:
+
+            with controller.batch():
+                for servo_id in servo_ids:
+                    controller.motor_on(servo_id)
+                    controller.led_off(servo_id)
+        """
+        local = self._local
+        depth = getattr(local, 'depth', 0)
+        if depth == 0:
+            local.batch = bytearray()
+        local.depth = depth + 1
+        try:
+            yield self
+        finally:
+            local.depth -= 1
+            if local.depth == 0:
+                self._acquire(PRIORITY_MOTION)
+                try:
+                    self._flush()
+                finally:
+                    local.batch = None
+                    self._lock.release()
+
+    def _schedule_flush(self):
+        self._flush_deadline = time.monotonic() + self.flush_window
+        if self._flusher is None:
+            self._flusher = threading.Thread(
+                target=self._flush_loop, name='lx16a-flusher', daemon=True,
+            )
+            self._flusher.start()
+        self._flush_event.set()
+
+    def _flush_loop(self):
+        while True:
+            self._flush_event.wait()
+            self._flush_event.clear()
+            delay = self._flush_deadline - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            self.flush()
+
+    def _receive(self, data):
+        """Feeds data received from serial port into packet decoder."""
+        if self._stats is not None:
+            self._stats.bytes_received += len(data)
+        if self.capture is not None:
+            self.capture.record_rx(data)
+        if self._echo:
+            data = self._discard_echo(data)
+        self._decoder.feed(data)
+
+    def _discard_echo(self, data):
+        """Strips echo of sent data from beginning of received data."""
+        with self._echo_lock:
+            size = min(len(self._echo), len(data))
+            expected = self._echo[:size]
+            if data[:size] == expected:
+                del self._echo[:size]
+                return data[size:]
+
+            # Echo got garbled by another device transmitting at the same
+            # time or is preceded by noise
+            self.collisions += 1
+            echo = bytes(self._echo)
+            del self._echo[:]
+        LOGGER.warning('Bus collision: expected echo %s, got %s',
+                       list(expected), list(data[:size]))
+
+        # Echo must never reach decoder, where echo of a query would
+        # look like a response to it
+        idx = data.find(echo)
+        if idx >= 0:
+            return data[:idx] + data[idx + len(echo):]
+        return data[size:]
+
+    def _send_frame(self, frame):
+        """Writes packet encoded in frame buffer. Must be called with lock held."""
+        if LOGGER.isEnabledFor(logging.DEBUG):
+            LOGGER.debug('Sending servo control packet: %s', list(frame))
+        self._write(frame)
+
+    def _send_packet(self, servo_id, command, params):
+        """Encodes packet with byte parameters into frame buffer and
+        writes it. Must be called with lock held."""
+        count = len(params)
+        _PACKETS[count].pack_into(
+            self._frame, 0, *_packet_fields(servo_id, command, params),
+        )
+        self._send_frame(self._frames[count])
+
+    def _command(self, servo_id, command, *params, priority=None):
+        if priority is None:
+            priority = COMMAND_PRIORITIES.get(command, PRIORITY_CONFIG)
+        self._acquire(priority)
+        try:
+            self._send_packet(servo_id, command, params)
+            if priority == PRIORITY_EMERGENCY:
+                self._flush()
+        finally:
+            self._lock.release()
+
+    def _command_words(self, servo_id, command, first, second):
+        """Sends command with two 16-bit parameters."""
+        fields = _words_fields(servo_id, command, first, second)
+        self._acquire(COMMAND_PRIORITIES.get(command, PRIORITY_CONFIG))
+        try:
+            _WORDS_PACKET.pack_into(self._frame, 0, *fields)
+            self._send_frame(self._frames[4])
+        finally:
+            self._lock.release()
+
+    def _read(self, timeout, cancel=None, length=None, preempt_at=None,
+              priority=PRIORITY_TELEMETRY):
+        """Reads all available data (but at least enough to complete
+        next packet) into packet decoder.
+
+        If cancellation token is given, port is read in slices of
+        CANCEL_POLL_INTERVAL, so cancellation is noticed while waiting.
+
+        Args:
+            timeout - serial.serialutil.Timeout
+            cancel - optional CancellationToken
+            length - expected length field of response, so that whole
+                response is read at once
+            preempt_at - time.monotonic() time after which read times out
+                as soon as commands of higher priority class than
+                `priority` are waiting for bus
+            priority - priority class of query being read
+        """
+        # Read echo and response in one go
+        size = max(len(self._echo) + self._decoder.bytes_needed(length),
+                   self._serial.in_waiting)
+        if cancel is None and preempt_at is None:
             self._serial.timeout = timeout.time_left()
             data = self._serial.read(size)
-            if len(data) != size:
-                raise TimeoutError()
-            return data
+        else:
+            while True:
+                wait = timeout.time_left()
+                if cancel is not None:
+                    cancel.raise_if_cancelled()
+                    wait = min(wait, self.CANCEL_POLL_INTERVAL)
+                if preempt_at is not None:
+                    now = time.monotonic()
+                    if now < preempt_at:
+                        wait = min(wait, preempt_at - now)
+                    elif self._lock.should_yield(priority):
+                        self.preemptions += 1
+                        raise TimeoutError()
+                    else:
+                        wait = min(wait, self.CANCEL_POLL_INTERVAL)
+
+                self._serial.timeout = wait
+                data = self._serial.read(size)
+                if data or timeout.expired():
+                    break
+        if not data:
+            raise TimeoutError()
+        self._receive(data)
+
+    def _wait_for_response(self, servo_id, command, timeout=None, cancel=None,
+                           preempt_at=None, priority=PRIORITY_TELEMETRY):
+        timeout = Timeout(timeout or self._timeout)
+        length = RESPONSE_LENGTHS.get(command)
 
         while True:
-            data = []
-            data += read(1)
-            if data[-1] != 0x55:
-                continue
-            data += read(1)
-            if data[-1] != 0x55:
-                continue
-            data += read(3)
-            sid = data[2]
-            length = data[3]
-            cmd = data[4]
-            if length > 7:
-                LOGGER.error('Invalid length for packet %s', list(data))
-                continue
+            for packet in self._decoder.decode():
+                sid = packet[2]
+                cmd = packet[4]
+
+                if not _is_response(packet):
+                    self.unexpected_responses += 1
+                    LOGGER.warning('Got packet that is not a command %s response: %s',
+                                   cmd, list(packet))
+                    continue
+
+                if cmd != command:
+                    self.unexpected_responses += 1
+                    LOGGER.warning('Got unexpected command %s response %s',
+                                   cmd, list(packet))
+                    continue
+
+                if servo_id != SERVO_ID_ALL and sid != servo_id:
+                    self.unexpected_responses += 1
+                    LOGGER.warning('Got command response from unexpected servo %s', sid)
+                    continue
+
+                return [sid, cmd, *packet[5:-1]]
+
+            # Response that has started arriving is not preempted
+            self._read(timeout, cancel, length,
+                       preempt_at if not len(self._decoder) else None, priority)
+
+    def _count_retry(self, exc):
+        self.retries += 1
+
+    def _query(self, servo_id, command, timeout=None, retry=None, cancel=None):
+        retry = retry if retry is not None else self.retry
+        if retry is None:
+            if cancel is not None:
+                cancel.raise_if_cancelled()
+            return self._query_once(servo_id, command, timeout, cancel)
+
+        return retry.call(
+            partial(self._query_once, cancel=cancel), servo_id, command,
+            timeout=timeout or self._timeout, cancel=cancel,
+            on_retry=self._count_retry,
+        )
 
-            data += read(length-3) if length > 3 else []
-            params = data[5:]
-            data += read(1)
-            checksum = data[-1]
-            if 255-(sid + length + cmd + sum(params)) % 256 != checksum:
-                LOGGER.error('Invalid checksum for packet %s', list(data))
-                continue
+    def _query_once(self, servo_id, command, timeout=None, cancel=None):
+        if self._stats is None:
+            return self._do_query(servo_id, command, timeout, cancel)
+
+        start = time.perf_counter()
+        try:
+            response = self._do_query(servo_id, command, timeout, cancel)
+        except TimeoutError:
+            self._stats.timeouts[command] += 1
+            raise
+        self._stats.observe_query(
+            None if servo_id == SERVO_ID_ALL else servo_id, command,
+            time.perf_counter() - start,
+        )
+        return response
+
+    def _wait_for_future(self, future, timeout, cancel):
+        """Waits for query future result, checking cancellation token
+        every CANCEL_POLL_INTERVAL."""
+        timeout = Timeout(timeout)
+        while not future.done() and not timeout.expired():
+            if cancel.cancelled:
+                future.cancel()
+                raise CancelledError()
+            concurrent.futures.wait(
+                [future], min(timeout.time_left(), self.CANCEL_POLL_INTERVAL),
+            )
+        return future.result(0)
+
+    def _do_query(self, servo_id, command, timeout, cancel=None):
+        if self._reader is not None:
+            future = self.query_async(servo_id, command, timeout=timeout)
+            try:
+                if cancel is not None:
+                    return self._wait_for_future(future, timeout or self._timeout, cancel)
+                return future.result(timeout or self._timeout)
+            except (concurrent.futures.TimeoutError,
+                    concurrent.futures.CancelledError):
+                future.cancel()
+                raise TimeoutError()
 
-            if cmd != command:
-                LOGGER.warning('Got unexpected command %s response %s',
-                               cmd, list(data))
-                continue
+        priority = COMMAND_PRIORITIES.get(command, PRIORITY_CONFIG)
+        self._acquire(priority)
+        try:
+            self._send_packet(servo_id, command, ())
+            self._flush()
+
+            start = time.monotonic()
+            preempt_at = None
+            if priority != PRIORITY_EMERGENCY:
+                preempt_at = start + max(self.PREEMPT_MIN_TIMEOUT,
+                                         self.PREEMPT_RTT_FACTOR * self._rtt)
+
+            response = self._wait_for_response(servo_id, command, timeout=timeout,
+                                               cancel=cancel, preempt_at=preempt_at,
+                                               priority=priority)
+
+            # Exponentially weighted moving average of round trip time
+            rtt = time.monotonic() - start
+            self._rtt = rtt if not self._rtt else self._rtt + (rtt - self._rtt) / 8
+            return response
+        except (TimeoutError, CancelledError):
+            if self._echo:
+                # Do not expect echo that has not arrived in time
+                with self._echo_lock:
+                    del self._echo[:]
+            raise
+        finally:
+            self._lock.release()
+
+    def stats(self):
+        """Returns snapshot of controller statistics.
+
+        Latency and traffic statistics are available only if controller
+        was created with `stats=True`.
+        """
+        result = {
+            'checksum_errors': self._decoder.checksum_errors,
+            'skipped_bytes': self._decoder.skipped_bytes,
+            'unexpected_responses': self.unexpected_responses,
+            'late_responses': self.late_responses,
+            'retries': self.retries,
+            'collisions': self.collisions,
+            'preemptions': self.preemptions,
+            'scheduler': self._lock.stats(),
+        }
+        if self._stats is not None:
+            result.update(self._stats.snapshot())
+        return result
+
+    def start_reader(self):
+        """Starts background thread that reads and decodes responses.
+
+        While reader is running, responses are matched to pending queries
+        by servo ID and command, so multiple queries can be in flight at
+        the same time (see `query_async`). Responses that do not match any
+        pending query are counted in `late_responses` (if query has already
+        timed out) and `unexpected_responses` attributes.
+        """
+        with self._lock:
+            if self._reader is not None:
+                return
+
+            self._serial.timeout = self.READER_POLL_INTERVAL
+            self._reader_stop.clear()
+            self._reader = threading.Thread(
+                target=self._reader_loop, name='lx16a-reader', daemon=True,
+            )
+            self._reader.start()
+
+    def stop_reader(self):
+        """Stops background reader thread and cancels all pending queries."""
+        with self._lock:
+            reader = self._reader
+            if reader is None:
+                return
+
+            self._reader_stop.set()
+            if reader is not threading.current_thread():
+                reader.join()
+            self._reader = None
+
+            with self._pending_lock:
+                pending, self._pending = self._pending, {}
+                self._expired = {}
+            for futures in pending.values():
+                for _, future, _ in futures:
+                    future.cancel()
+
+    def query_async(self, servo_id, command, timeout=None):
+        """Sends query and returns `concurrent.futures.Future` that resolves
+        to response data or fails with TimeoutError.
+
+        Requires background reader to be running (see `start_reader`).
+        """
+        if self._reader is None:
+            raise RuntimeError('Background reader is not running')
+
+        future = concurrent.futures.Future()
+        now = time.monotonic()
+        entry = [now + (timeout or self._timeout), future, now]
+        with self._pending_lock:
+            self._pending.setdefault((servo_id, command), deque()).append(entry)
+        self._acquire(COMMAND_PRIORITIES.get(command, PRIORITY_CONFIG))
+        try:
+            self._send_packet(servo_id, command, ())
+            self._flush()
+            entry[2] = time.monotonic()
+        finally:
+            self._lock.release()
+        return future
+
+    def _reader_loop(self):
+        next_expiration = time.monotonic() + self.READER_POLL_INTERVAL
+        while not self._reader_stop.is_set():
+            try:
+                data = self._serial.read(max(1, self._serial.in_waiting))
+            except Exception as e:
+                LOGGER.error('Error reading serial port: %s', e)
+                self._fail_pending(e)
+                self._reader_stop.set()
+                break
+
+            if data:
+                self._receive(data)
+                for packet in self._decoder.decode():
+                    self._dispatch_response(packet)
+
+            now = time.monotonic()
+            if now >= next_expiration:
+                self._expire_pending(now)
+                next_expiration = now + self.READER_POLL_INTERVAL
+
+    def _dispatch_response(self, packet):
+        sid = packet[2]
+        cmd = packet[4]
+        if not _is_response(packet):
+            self.unexpected_responses += 1
+            LOGGER.warning('Got packet that is not a command %s response: %s',
+                           cmd, list(packet))
+            return
+        response = [sid, cmd, *packet[5:-1]]
+        now = time.monotonic()
+
+        with self._pending_lock:
+            for key in ((sid, cmd), (SERVO_ID_ALL, cmd)):
+                futures = self._pending.get(key)
+                expired = self._expired.get(key)
+                while expired and expired[0] <= now:
+                    expired.popleft()
+
+                # Response to pending query can not arrive sooner than
+                # (half of) shortest round trip time after it was sent,
+                # such response belongs to a timed out query
+                if expired and (not futures or (
+                        self._min_rtt is not None and
+                        now - futures[0][2] < self._min_rtt / 2)):
+                    expired.popleft()
+                    if not expired:
+                        del self._expired[key]
+                    self.late_responses += 1
+                    LOGGER.debug('Got late command %s response %s',
+                                 cmd, list(packet))
+                    return
+
+                if futures:
+                    _, future, sent_at = futures.popleft()
+                    if future.set_running_or_notify_cancel():
+                        future.set_result(response)
+                        rtt = now - sent_at
+                        if self._min_rtt is None or rtt < self._min_rtt:
+                            self._min_rtt = rtt
+                        return
+                    # Caller has given up waiting for this response
+                    self.late_responses += 1
+                    return
+
+        self.unexpected_responses += 1
+        LOGGER.warning('Got unexpected command %s response %s', cmd, list(packet))
+
+    def _expire_pending(self, now):
+        expired = []
+        with self._pending_lock:
+            for key in list(self._expired):
+                entries = self._expired[key]
+                while entries and entries[0] <= now:
+                    entries.popleft()
+                if not entries:
+                    del self._expired[key]
+
+            for key, futures in self._pending.items():
+                while futures and futures[0][0] <= now:
+                    expired.append(futures.popleft()[1])
+                    self._expired.setdefault(key, deque()).append(
+                        now + self.LATE_RESPONSE_TTL
+                    )
+
+        for future in expired:
+            if future.set_running_or_notify_cancel():
+                future.set_exception(TimeoutError())
+
+    def _fail_pending(self, exc):
+        with self._pending_lock:
+            pending, self._pending = self._pending, {}
+
+        for futures in pending.values():
+            for _, future, _ in futures:
+                if future.set_running_or_notify_cancel():
+                    future.set_exception(exc)
+
+    def query_many(self, queries, timeout=None, cancel=None):
+        """Sends multiple queries back-to-back and collects their responses.
+
+        Each query waits for its response before sending the next one
+        (servo bus is half-duplex). Bus is released between queries, so
+        higher priority commands (e.g. moves) do not wait for the whole
+        batch. Timed out queries do not abort the batch.
+
+        Args:
+            queries - list of (servo_id, command) tuples
+            timeout - timeout for each individual query
+            cancel - optional CancellationToken to abort the batch
+
+        Returns:
+            dict mapping (servo_id, command) tuples to response data
+            or TimeoutError instances for queries that have timed out,
+            in order of queries
+
+        Raises:
+            CancelledError if batch was cancelled
+        """
+        results = {}
+        for servo_id, command in queries:
+            try:
+                results[(servo_id, command)] = \
+                    self._query(servo_id, command, timeout=timeout, cancel=cancel)
+            except TimeoutError as e:
+                results[(servo_id, command)] = e
+        return results
+
+    def _get_many(self, servo_ids, command, decode, timeout=None):
+        responses = self.query_many(
+            [(servo_id, command) for servo_id in servo_ids], timeout=timeout,
+        )
+        return {
+            servo_id: (
+                response if isinstance(response, TimeoutError) else decode(response)
+            )
+            for (servo_id, _), response in responses.items()
+        }
+
+    def get_positions(self, servo_ids, timeout=None):
+        """Reads positions of servos with given IDs.
+
+        Returns:
+            dict mapping servo ID to position or TimeoutError instance
+        """
+        return self._get_many(servo_ids, SERVO_POS_READ, _decode_position, timeout)
+
+    def get_temperatures(self, servo_ids, timeout=None):
+        """Reads temperatures of servos with given IDs.
+
+        Returns:
+            dict mapping servo ID to temperature or TimeoutError instance
+        """
+        return self._get_many(servo_ids, SERVO_TEMP_READ, _decode_temperature, timeout)
+
+    def get_voltages(self, servo_ids, timeout=None):
+        """Reads voltages of servos with given IDs.
+
+        Returns:
+            dict mapping servo ID to voltage or TimeoutError instance
+        """
+        return self._get_many(servo_ids, SERVO_VIN_READ, _decode_voltage, timeout)
+
+    def _bus_errors(self):
+        return (
+            self._decoder.skipped_bytes,
+            self._decoder.checksum_errors,
+            self.unexpected_responses,
+            len(self._decoder),
+        )
 
-            if servo_id != SERVO_ID_ALL and sid != servo_id:
-                LOGGER.warning('Got command response from unexpected servo %s', sid)
-                continue
+    def _drain(self):
+        """Decodes and discards data already received by serial port.
 
-            return [sid, cmd, *params]
+        Returns number of discarded packets.
+        """
+        if self._reader is not None:
+            return 0
 
-    def _query(self, servo_id, command, timeout=None):
         with self._lock:
-            self._command(servo_id, command)
-            return self._wait_for_response(servo_id, command, timeout=timeout)
+            in_waiting = self._serial.in_waiting
+            if in_waiting:
+                self._serial.timeout = 0
+                self._receive(self._serial.read(in_waiting))
+            return sum(1 for _ in self._decoder.decode())
+
+    def scan(self, servo_ids=range(1, 253), hints=(), broadcast=False,
+             timeout=None, min_timeout=0.01, rtt_factor=4, cancel=None):
+        """Scans bus for servos and yields IDs of servos as they are found.
+
+        Probes use `timeout` until first servo responds. After that probe
+        timeout is set to `rtt_factor` times the longest round trip time
+        measured so far (but not less than `min_timeout`). Servos whose
+        probes timed out shortly before a late response was received are
+        probed again at the end of the scan, with timeout long enough for
+        that response.
+
+        Args:
+            servo_ids - iterable of servo IDs to probe
+            hints - iterable of servo IDs to probe first (e.g. previously
+                known IDs)
+            broadcast - if True, starts with broadcast ID query: if nobody
+                responds, bus is considered empty; if exactly one servo
+                responds without collisions, it is considered to be the
+                only servo on the bus
+            timeout - initial probe timeout in seconds (default SCAN_TIMEOUT)
+            min_timeout - minimum probe timeout in seconds
+            rtt_factor - ratio of probe timeout to round trip time
+            cancel - optional CancellationToken to stop scanning
+        """
+        timeout = initial_timeout = timeout or self.SCAN_TIMEOUT
+        max_rtt = 0
+        probed = set()
+        # (servo ID, probe start time) of probes that timed out and could
+        # still get late response, (servo ID, timeout) of probes to repeat
+        missed = deque()
+        suspects = []
+
+        def late_responses():
+            return self.late_responses + self.unexpected_responses
+
+        def check_late(errors, since):
+            """Makes suspects of probes that timed out less than initial
+            timeout before `since` if late responses were received."""
+            while missed and missed[0][1] < since - initial_timeout:
+                missed.popleft()
+            if late_responses() != errors:
+                now = time.monotonic()
+                suspects.extend((servo_id, now - start) for servo_id, start in missed)
+                missed.clear()
+
+        def probe(servo_id):
+            start = time.monotonic()
+            try:
+                response = self._query(servo_id, SERVO_ID_READ, timeout=timeout,
+                                       cancel=cancel)
+            except (TimeoutError, CancelledError):
+                return None, None
+            return response[2], time.monotonic() - start
+
+        if broadcast:
+            errors = self._bus_errors()
+            servo_id, rtt = probe(SERVO_ID_ALL)
+            if servo_id is None:
+                if self._bus_errors() == errors:
+                    return
+            else:
+                max_rtt = rtt
+                timeout = max(min_timeout, max_rtt * rtt_factor)
+
+                # Let responses of other servos (if any) arrive
+                time.sleep(timeout)
+                extra = self._drain()
+
+                probed.add(servo_id)
+                yield servo_id
+
+                if extra == 0 and self._bus_errors() == errors:
+                    return
+
+        for servo_id in chain(hints, servo_ids):
+            if cancel is not None and cancel.cancelled:
+                return
+            if servo_id in probed:
+                continue
+            probed.add(servo_id)
+
+            errors = late_responses()
+            start = time.monotonic()
+            sid, rtt = probe(servo_id)
+            check_late(errors, start)
+            if sid is None:
+                if timeout < initial_timeout:
+                    missed.append((servo_id, start))
+                continue
+
+            if rtt > max_rtt:
+                max_rtt = rtt
+                timeout = max(min_timeout, max_rtt * rtt_factor)
+
+            yield sid
+
+        if missed and not (cancel is not None and cancel.cancelled):
+            # Let late responses to last probes arrive
+            end = time.monotonic()
+            while missed and time.monotonic() < missed[-1][1] + initial_timeout:
+                errors = late_responses()
+                time.sleep(min_timeout)
+                if self._drain():
+                    errors = None
+                check_late(errors, end)
+
+        for servo_id, timeout in suspects:
+            if cancel is not None and cancel.cancelled:
+                return
+            timeout = min(initial_timeout, max(min_timeout, timeout))
+            sid, _ = probe(servo_id)
+            if sid is not None:
+                yield sid
 
     def servo(self, servo_id):
         return Servo(self, servo_id)
 
-    def get_servo_id(self, servo_id=SERVO_ID_ALL, timeout=None):
-        response = self._query(servo_id, SERVO_ID_READ, timeout=timeout)
-        return response[2]
+    def _cached(self, servo_id, name, read):
+        if self.cache is None or servo_id == SERVO_ID_ALL:
+            return read()
+
+        try:
+            return self.cache.get(servo_id, name)
+        except KeyError:
+            pass
+
+        value = read()
+        self.cache.put(servo_id, name, value)
+        return value
+
+    def _update_cache(self, servo_id, name, value):
+        if self.cache is not None:
+            self.cache.put(servo_id, name, value)
+
+    def refresh_configuration(self, servo_id, timeout=None):
+        """Drops cached configuration of given servo and reads it again."""
+        if self.cache is not None:
+            self.cache.invalidate(servo_id)
+
+        self.get_servo_id(servo_id, timeout=timeout)
+        self.get_position_offset(servo_id, timeout=timeout)
+        self.get_position_limits(servo_id, timeout=timeout)
+        self.get_voltage_limits(servo_id, timeout=timeout)
+        self.get_max_temperature_limit(servo_id, timeout=timeout)
+
+    def get_servo_id(self, servo_id=SERVO_ID_ALL, timeout=None, retry=None, cancel=None):
+        def read():
+            response = self._query(servo_id, SERVO_ID_READ, timeout=timeout,
+                                   retry=retry, cancel=cancel)
+            return _decode_byte(response)
+        return self._cached(servo_id, 'servo_id', read)
 
     def set_servo_id(self, servo_id, new_servo_id):
         self._command(servo_id, SERVO_ID_WRITE, new_servo_id)
+        if self.cache is not None:
+            if servo_id == SERVO_ID_ALL:
+                self.cache.invalidate()
+            else:
+                self.cache.rename(servo_id, new_servo_id)
+            self.cache.put(new_servo_id, 'servo_id', new_servo_id)
 
     def move(self, servo_id, position, time=0):
-        position = clamp(0, 1000, position)
-        time = clamp(0, 30000, time)
-
-        self._command(
+        self._command_words(
             servo_id, SERVO_MOVE_TIME_WRITE,
-            lower_byte(position), higher_byte(position),
-            lower_byte(time), higher_byte(time),
+            min(1000, max(0, position)), min(30000, max(0, time)),
         )
 
-    def get_prepared_move(self, servo_id, timeout=None):
+    def get_prepared_move(self, servo_id, timeout=None, retry=None, cancel=None):
         """Returns servo position and time tuple"""
-        response = self._query(servo_id, SERVO_MOVE_TIME_WAIT_READ, timeout=timeout)
-        return word(response[2], response[3]), word(response[4], response[5])
+        response = self._query(servo_id, SERVO_MOVE_TIME_WAIT_READ, timeout=timeout,
+                               retry=retry, cancel=cancel)
+        return _decode_words(response)
 
     def move_prepare(self, servo_id, position, time=0):
-        position = clamp(0, 1000, position)
-        time = clamp(0, 30000, time)
-
-        self._command(
+        self._command_words(
             servo_id, SERVO_MOVE_TIME_WAIT_WRITE,
-            lower_byte(position), higher_byte(position),
-            lower_byte(time), higher_byte(time),
+            min(1000, max(0, position)), min(30000, max(0, time)),
         )
 
+    def move_many(self, moves, start=True):
+        """Synchronously moves multiple servos.
+
+        Prepared moves for all servos followed by a broadcast move start
+        command are sent with a single write.
+
+        Args:
+            moves - dict mapping servo ID to (position, time) tuple
+            start - if False, only prepare moves (to be started later
+                with `move_start`)
+        """
+        size = _MOVE_PACKET.size * len(moves)
+        if start:
+            size += len(_MOVE_START_PACKET)
+        pack_into = _MOVE_PACKET.pack_into
+
+        self._acquire(PRIORITY_MOTION)
+        try:
+            if len(self._move_buffer) < size:
+                self._move_buffer = bytearray(size)
+            buf = self._move_buffer
+
+            offset = 0
+            for servo_id, (position, move_time) in moves.items():
+                position = int(min(1000, max(0, position)))
+                move_time = int(min(30000, max(0, move_time)))
+                checksum = 255 - (
+                    servo_id + 7 + SERVO_MOVE_TIME_WAIT_WRITE +
+                    (position & 0xff) + (position >> 8) +
+                    (move_time & 0xff) + (move_time >> 8)
+                ) % 256
+                pack_into(
+                    buf, offset, 0x55, 0x55, servo_id, 7,
+                    SERVO_MOVE_TIME_WAIT_WRITE, position, move_time, checksum,
+                )
+                offset += _MOVE_PACKET.size
+            if start:
+                buf[offset:size] = _MOVE_START_PACKET
+
+            if LOGGER.isEnabledFor(logging.DEBUG):
+                LOGGER.debug('Sending servo control packets: %s', list(buf[:size]))
+            self._write(memoryview(buf)[:size])
+        finally:
+            self._lock.release()
+
+    def position_offsets_array(self, servo_ids, timeout=None):
+        """Returns NumPy array of position offsets (in ticks) of servos
+        with given IDs (see `get_position_offset`).
+
+        Offsets are read from servos once if controller has configuration
+        cache, otherwise on every call.
+        """
+        import numpy as np
+
+        return np.array([
+            self.get_position_offset(int(servo_id), timeout=timeout)
+            for servo_id in servo_ids
+        ], dtype=np.float64)
+
+    def move_array(self, servo_ids, positions, times=0, start=True, degrees=False):
+        """Synchronously moves multiple servos to positions given as arrays.
+
+        Same as `move_many`, but clamping, packing and checksums of all
+        packets are computed with vectorized NumPy operations.
+
+        Args:
+            servo_ids - sequence or array of servo IDs
+            positions - array of positions in ticks (or in degrees from
+                center position if `degrees` is True)
+            times - move time in milliseconds, either one for all servos
+                or array of per-servo times
+            start - if False, only prepare moves (to be started later
+                with `move_start`)
+            degrees - if True, positions are converted from degrees using
+                each servo's position offset (see `position_offsets_array`)
+        """
+        import numpy as np
+
+        if degrees:
+            positions = degrees_to_ticks(
+                np.asarray(positions, dtype=np.float64),
+                self.position_offsets_array(servo_ids),
+            )
+
+        servo_ids = np.asarray(servo_ids, dtype=np.uint8)
+        count = len(servo_ids)
+        positions = np.broadcast_to(
+            np.clip(np.rint(positions), 0, 1000).astype(np.uint16), (count,))
+        times = np.broadcast_to(
+            np.clip(np.rint(times), 0, 30000).astype(np.uint16), (count,))
+
+        frames = np.empty((count, _MOVE_PACKET.size), dtype=np.uint8)
+        frames[:, 0] = 0x55
+        frames[:, 1] = 0x55
+        frames[:, 2] = servo_ids
+        frames[:, 3] = 7
+        frames[:, 4] = SERVO_MOVE_TIME_WAIT_WRITE
+        frames[:, 5] = positions & 0xff
+        frames[:, 6] = positions >> 8
+        frames[:, 7] = times & 0xff
+        frames[:, 8] = times >> 8
+        frames[:, 9] = 255 - frames[:, 2:9].sum(axis=1, dtype=np.uint32) % 256
+
+        data = frames.tobytes()
+        if start:
+            data += _MOVE_START_PACKET
+
+        self._acquire(PRIORITY_MOTION)
+        try:
+            if LOGGER.isEnabledFor(logging.DEBUG):
+                LOGGER.debug('Sending servo control packets: %s', list(data))
+            self._write(data)
+        finally:
+            self._lock.release()
+
+    def read_positions_array(self, servo_ids, timeout=None, degrees=False):
+        """Reads positions of servos with given IDs into NumPy array.
+
+        Args:
+            servo_ids - sequence or array of servo IDs
+            timeout - query timeout in seconds
+            degrees - if True, positions are converted to degrees from
+                center position using each servo's position offset (see
+                `position_offsets_array`)
+
+        Returns:
+            float array of positions in ticks (or degrees) in order of
+            servo IDs, with NaN for servos that have timed out
+        """
+        import numpy as np
+
+        raw = np.zeros((len(servo_ids), 2), dtype=np.uint8)
+        received = np.zeros(len(servo_ids), dtype=bool)
+        for idx, servo_id in enumerate(servo_ids):
+            try:
+                response = self._query(int(servo_id), SERVO_POS_READ, timeout=timeout)
+            except TimeoutError:
+                continue
+            raw[idx] = response[2:4]
+            received[idx] = True
+
+        positions = raw.view('<i2')[:, 0].astype(np.float64)
+        positions[~received] = np.nan
+        if degrees:
+            offsets = np.zeros(len(servo_ids))
+            offsets[received] = self.position_offsets_array(
+                np.asarray(servo_ids)[received], timeout=timeout,
+            )
+            positions = ticks_to_degrees(positions, offsets)
+        return positions
+
     def move_start(self, servo_id=SERVO_ID_ALL):
         self._command(servo_id, SERVO_MOVE_START)
 
     def move_stop(self, servo_id=SERVO_ID_ALL):
         self._command(servo_id, SERVO_MOVE_STOP)
 
-    def get_position_offset(self, servo_id, timeout=None):
-        response = self._query(servo_id, SERVO_ANGLE_OFFSET_READ, timeout=timeout)
-        deviation = response[2]
-        if deviation > 127:
-            deviation -= 256
-        return deviation
+    def get_position_offset(self, servo_id, timeout=None, retry=None, cancel=None):
+        def read():
+            response = self._query(servo_id, SERVO_ANGLE_OFFSET_READ, timeout=timeout,
+                                   retry=retry, cancel=cancel)
+            return _decode_position_offset(response)
+        return self._cached(servo_id, 'position_offset', read)
 
     def set_position_offset(self, servo_id, deviation):
         deviation = clamp(-125, 125, deviation)
-        if deviation < 0:
-            deviation += 256
-        self._command(servo_id, SERVO_ANGLE_OFFSET_ADJUST, deviation)
+        self._command(servo_id, SERVO_ANGLE_OFFSET_ADJUST, _encode_position_offset(deviation))
+        self._update_cache(servo_id, 'position_offset', deviation)
 
     def save_position_offset(self, servo_id):
         self._command(servo_id, SERVO_ANGLE_OFFSET_WRITE)
 
-    def get_position_limits(self, servo_id, timeout=None):
-        response = self._query(servo_id, SERVO_ANGLE_LIMIT_READ, timeout=timeout)
-        return word(response[2], response[3]), word(response[4], response[5])
+    def get_position_limits(self, servo_id, timeout=None, retry=None, cancel=None):
+        def read():
+            response = self._query(servo_id, SERVO_ANGLE_LIMIT_READ, timeout=timeout,
+                                   retry=retry, cancel=cancel)
+            return _decode_words(response)
+        return self._cached(servo_id, 'position_limits', read)
 
     def set_position_limits(self, servo_id, min_position, max_position):
         min_position = clamp(0, 1000, min_position)
         max_position = clamp(0, 1000, max_position)
-        self._command(
-            servo_id, SERVO_ANGLE_LIMIT_WRITE,
-            lower_byte(min_position), higher_byte(min_position),
-            lower_byte(max_position), higher_byte(max_position),
-        )
+        self._command_words(servo_id, SERVO_ANGLE_LIMIT_WRITE, min_position, max_position)
+        self._update_cache(servo_id, 'position_limits', (min_position, max_position))
 
-    def get_voltage_limits(self, servo_id, timeout=None):
-        response = self._query(servo_id, SERVO_VIN_LIMIT_READ, timeout=timeout)
-        return word(response[2], response[3]), word(response[4], response[5])
+    def get_voltage_limits(self, servo_id, timeout=None, retry=None, cancel=None):
+        def read():
+            response = self._query(servo_id, SERVO_VIN_LIMIT_READ, timeout=timeout,
+                                   retry=retry, cancel=cancel)
+            return _decode_words(response)
+        return self._cached(servo_id, 'voltage_limits', read)
 
     def set_voltage_limits(self, servo_id, min_voltage, max_voltage):
         min_voltage = clamp(4500, 12000, min_voltage)
         max_voltage = clamp(4500, 12000, max_voltage)
-        self._command(
-            servo_id, SERVO_VIN_LIMIT_WRITE,
-            lower_byte(min_voltage), higher_byte(min_voltage),
-            lower_byte(max_voltage), higher_byte(max_voltage),
-        )
+        self._command_words(servo_id, SERVO_VIN_LIMIT_WRITE, min_voltage, max_voltage)
+        self._update_cache(servo_id, 'voltage_limits', (min_voltage, max_voltage))
 
-    def get_max_temperature_limit(self, servo_id, timeout=None):
-        response = self._query(servo_id, SERVO_TEMP_MAX_LIMIT_READ, timeout=timeout)
-        return response[2]
+    def get_max_temperature_limit(self, servo_id, timeout=None, retry=None, cancel=None):
+        def read():
+            response = self._query(servo_id, SERVO_TEMP_MAX_LIMIT_READ, timeout=timeout,
+                                   retry=retry, cancel=cancel)
+            return _decode_byte(response)
+        return self._cached(servo_id, 'max_temperature_limit', read)
 
     def set_max_temperature_limit(self, servo_id, max_temperature):
         max_temperature = clamp(50, 100, max_temperature)
         self._command(servo_id, SERVO_TEMP_MAX_LIMIT_WRITE, max_temperature)
+        self._update_cache(servo_id, 'max_temperature_limit', max_temperature)
 
-    def get_temperature(self, servo_id, timeout=None):
-        response = self._query(servo_id, SERVO_TEMP_READ, timeout=timeout)
-        return response[2]
+    def get_temperature(self, servo_id, timeout=None, retry=None, cancel=None):
+        response = self._query(servo_id, SERVO_TEMP_READ, timeout=timeout,
+                               retry=retry, cancel=cancel)
+        return _decode_temperature(response)
 
-    def get_voltage(self, servo_id, timeout=None):
-        response = self._query(servo_id, SERVO_VIN_READ, timeout=timeout)
-        return word(response[2], response[3])
+    def get_voltage(self, servo_id, timeout=None, retry=None, cancel=None):
+        response = self._query(servo_id, SERVO_VIN_READ, timeout=timeout,
+                               retry=retry, cancel=cancel)
+        return _decode_voltage(response)
 
-    def get_position(self, servo_id, timeout=None):
-        response = self._query(servo_id, SERVO_POS_READ, timeout=timeout)
-        position = word(response[2], response[3])
-        if position > 32767:
-            position -= 65536
-        return position
+    def get_position(self, servo_id, timeout=None, retry=None, cancel=None):
+        response = self._query(servo_id, SERVO_POS_READ, timeout=timeout,
+                               retry=retry, cancel=cancel)
+        return _decode_position(response)
 
-    def get_mode(self, servo_id, timeout=None):
-        response = self._query(servo_id, SERVO_OR_MOTOR_MODE_READ, timeout=timeout)
-        return response[2]
+    def get_mode(self, servo_id, timeout=None, retry=None, cancel=None):
+        response = self._query(servo_id, SERVO_OR_MOTOR_MODE_READ, timeout=timeout,
+                               retry=retry, cancel=cancel)
+        return _decode_mode(response)
 
-    def get_motor_speed(self, servo_id, timeout=None):
-        response = self._query(servo_id, SERVO_OR_MOTOR_MODE_READ, timeout=timeout)
-        if response[2] != 1:
-            return 0
-        speed = word(response[4], response[5])
-        if speed > 32767:
-            speed -= 65536
-        return speed
+    def get_motor_speed(self, servo_id, timeout=None, retry=None, cancel=None):
+        response = self._query(servo_id, SERVO_OR_MOTOR_MODE_READ, timeout=timeout,
+                               retry=retry, cancel=cancel)
+        return _decode_motor_speed(response)
 
     def set_servo_mode(self, servo_id):
-        self._command(
-            servo_id, SERVO_OR_MOTOR_MODE_WRITE, 0, 0, 0, 0,
-        )
+        self._command_words(servo_id, SERVO_OR_MOTOR_MODE_WRITE, 0, 0)
 
     def set_motor_mode(self, servo_id, speed=0):
-        speed = clamp(-1000, 1000, speed)
-        if speed < 0:
-            speed += 65536
-        self._command(
-            servo_id, SERVO_OR_MOTOR_MODE_WRITE, 1, 0,
-            lower_byte(speed), higher_byte(speed),
+        self._command_words(
+            servo_id, SERVO_OR_MOTOR_MODE_WRITE, 1, min(1000, max(-1000, speed)),
         )
 
-    def is_motor_on(self, servo_id, timeout=None):
-        response = self._query(servo_id, SERVO_LOAD_OR_UNLOAD_READ, timeout=timeout)
-        return response[2] == 1
+    def is_motor_on(self, servo_id, timeout=None, retry=None, cancel=None):
+        response = self._query(servo_id, SERVO_LOAD_OR_UNLOAD_READ, timeout=timeout,
+                               retry=retry, cancel=cancel)
+        return _decode_motor_on(response)
 
     def motor_on(self, servo_id):
-        self._command(servo_id, SERVO_LOAD_OR_UNLOAD_WRITE, 1)
+        self._command(servo_id, SERVO_LOAD_OR_UNLOAD_WRITE, 1, priority=PRIORITY_MOTION)
 
     def motor_off(self, servo_id):
         self._command(servo_id, SERVO_LOAD_OR_UNLOAD_WRITE, 0)
 
-    def is_led_on(self, servo_id, timeout=None):
-        response = self._query(servo_id, SERVO_LED_CTRL_READ, timeout=timeout)
-        return response[2] == 0
+    def is_led_on(self, servo_id, timeout=None, retry=None, cancel=None):
+        response = self._query(servo_id, SERVO_LED_CTRL_READ, timeout=timeout,
+                               retry=retry, cancel=cancel)
+        return _decode_led_on(response)
 
     def led_on(self, servo_id):
         self._command(servo_id, SERVO_LED_CTRL_WRITE, 0)
@@ -311,9 +1979,10 @@ class ServoController(object):
     def led_off(self, servo_id):
         self._command(servo_id, SERVO_LED_CTRL_WRITE, 1)
 
-    def get_led_errors(self, servo_id, timeout=None):
-        response = self._query(servo_id, SERVO_LED_ERROR_READ, timeout=timeout)
-        return response[2]
+    def get_led_errors(self, servo_id, timeout=None, retry=None, cancel=None):
+        response = self._query(servo_id, SERVO_LED_ERROR_READ, timeout=timeout,
+                               retry=retry, cancel=cancel)
+        return _decode_led_errors(response)
 
     def set_led_errors(self, servo_id, error):
         error = clamp(0, 7, error)
@@ -0,0 +1,305 @@
+__all__ = [
+    'AsyncServoController',
+    'open_servo_controller',
+]
+
+
+import asyncio
+
+from lewansoul_lx16a import (
+    Servo, PacketDecoder, TimeoutError, LOGGER, clamp,
+)
+# Packet templates and encoders/decoders shared with ServoController
+from lewansoul_lx16a import (
+    _PACKETS, _WORDS_PACKET, _packet_fields, _words_fields, _is_response,
+    _encode_position_offset, _decode_byte, _decode_words,
+    _decode_position_offset, _decode_temperature, _decode_voltage,
+    _decode_position, _decode_mode, _decode_motor_speed, _decode_motor_on,
+    _decode_led_on, _decode_led_errors,
+)
+from lewansoul_lx16a import (
+    SERVO_ID_ALL,
+    SERVO_MOVE_TIME_WRITE,
+    SERVO_MOVE_TIME_WAIT_WRITE,
+    SERVO_MOVE_TIME_WAIT_READ,
+    SERVO_MOVE_START,
+    SERVO_MOVE_STOP,
+    SERVO_ID_WRITE,
+    SERVO_ID_READ,
+    SERVO_ANGLE_OFFSET_ADJUST,
+    SERVO_ANGLE_OFFSET_WRITE,
+    SERVO_ANGLE_OFFSET_READ,
+    SERVO_ANGLE_LIMIT_WRITE,
+    SERVO_ANGLE_LIMIT_READ,
+    SERVO_VIN_LIMIT_WRITE,
+    SERVO_VIN_LIMIT_READ,
+    SERVO_TEMP_MAX_LIMIT_WRITE,
+    SERVO_TEMP_MAX_LIMIT_READ,
+    SERVO_TEMP_READ,
+    SERVO_VIN_READ,
+    SERVO_POS_READ,
+    SERVO_OR_MOTOR_MODE_WRITE,
+    SERVO_OR_MOTOR_MODE_READ,
+    SERVO_LOAD_OR_UNLOAD_WRITE,
+    SERVO_LOAD_OR_UNLOAD_READ,
+    SERVO_LED_CTRL_WRITE,
+    SERVO_LED_CTRL_READ,
+    SERVO_LED_ERROR_WRITE,
+    SERVO_LED_ERROR_READ,
+)
+
+
+async def open_servo_controller(url, baudrate=115200, timeout=1, **kwargs):
+    """Opens serial port and returns AsyncServoController attached to it.
+
+    Requires pyserial-asyncio package.
+
+    Args:
+        url - serial port device name or pyserial URL
+        baudrate - serial port baud rate
+        timeout - default query timeout in seconds
+    """
+    import serial_asyncio
+
+    loop = asyncio.get_running_loop()
+    _, controller = await serial_asyncio.create_serial_connection(
+        loop, lambda: AsyncServoController(timeout=timeout),
+        url, baudrate=baudrate, **kwargs
+    )
+    return controller
+
+
+class AsyncServoController(asyncio.Protocol):
+    """Servo controller for asyncio applications.
+
+    Controller is an asyncio protocol and works on top of any asyncio
+    transport (e.g. created by pyserial-asyncio). All commands are
+    coroutines. Bus access is serialized with a FIFO lock so concurrent
+    callers are served in order they've issued their commands.
+    """
+
+    def __init__(self, timeout=1):
+        self._timeout = timeout
+        self._transport = None
+        self._lock = asyncio.Lock()
+        self._decoder = PacketDecoder()
+        self._pending = None
+
+    def connection_made(self, transport):
+        self._transport = transport
+
+    def connection_lost(self, exc):
+        self._transport = None
+        if self._pending is not None:
+            _, _, future = self._pending
+            if not future.done():
+                future.set_exception(exc or ConnectionError('Connection lost'))
+
+    def data_received(self, data):
+        self._decoder.feed(data)
+        for packet in self._decoder.decode():
+            sid = packet[2]
+            cmd = packet[4]
+
+            if not _is_response(packet):
+                LOGGER.warning('Got packet that is not a command %s response: %s',
+                               cmd, list(packet))
+                continue
+
+            if self._pending is None:
+                LOGGER.warning('Got unexpected command %s response %s',
+                               cmd, list(packet))
+                continue
+
+            servo_id, command, future = self._pending
+            if cmd != command:
+                LOGGER.warning('Got unexpected command %s response %s',
+                               cmd, list(packet))
+                continue
+
+            if servo_id != SERVO_ID_ALL and sid != servo_id:
+                LOGGER.warning('Got command response from unexpected servo %s', sid)
+                continue
+
+            if not future.done():
+                future.set_result([sid, cmd, *packet[5:-1]])
+
+    def close(self):
+        if self._transport is not None:
+            self._transport.close()
+
+    def _write(self, packet):
+        if self._transport is None:
+            raise ConnectionError('Not connected')
+
+        LOGGER.debug('Sending servo control packet: %s', list(packet))
+        self._transport.write(packet)
+
+    async def _send(self, packet):
+        async with self._lock:
+            self._write(packet)
+
+    async def _command(self, servo_id, command, *params):
+        await self._send(_PACKETS[len(params)].pack(
+            *_packet_fields(servo_id, command, params)
+        ))
+
+    async def _command_words(self, servo_id, command, first, second):
+        """Sends command with two 16-bit parameters."""
+        await self._send(_WORDS_PACKET.pack(
+            *_words_fields(servo_id, command, first, second)
+        ))
+
+    async def _query(self, servo_id, command, timeout=None):
+        async with self._lock:
+            future = asyncio.get_running_loop().create_future()
+            self._pending = (servo_id, command, future)
+            try:
+                self._write(_PACKETS[0].pack(*_packet_fields(servo_id, command, ())))
+                return await asyncio.wait_for(future, timeout or self._timeout)
+            except asyncio.TimeoutError:
+                raise TimeoutError()
+            finally:
+                self._pending = None
+
+    def servo(self, servo_id):
+        return Servo(self, servo_id)
+
+    async def get_servo_id(self, servo_id=SERVO_ID_ALL, timeout=None):
+        return _decode_byte(await self._query(servo_id, SERVO_ID_READ, timeout=timeout))
+
+    async def set_servo_id(self, servo_id, new_servo_id):
+        await self._command(servo_id, SERVO_ID_WRITE, new_servo_id)
+
+    async def move(self, servo_id, position, time=0):
+        await self._command_words(
+            servo_id, SERVO_MOVE_TIME_WRITE,
+            clamp(0, 1000, position), clamp(0, 30000, time),
+        )
+
+    async def get_prepared_move(self, servo_id, timeout=None):
+        """Returns servo position and time tuple"""
+        return _decode_words(
+            await self._query(servo_id, SERVO_MOVE_TIME_WAIT_READ, timeout=timeout)
+        )
+
+    async def move_prepare(self, servo_id, position, time=0):
+        await self._command_words(
+            servo_id, SERVO_MOVE_TIME_WAIT_WRITE,
+            clamp(0, 1000, position), clamp(0, 30000, time),
+        )
+
+    async def move_start(self, servo_id=SERVO_ID_ALL):
+        await self._command(servo_id, SERVO_MOVE_START)
+
+    async def move_stop(self, servo_id=SERVO_ID_ALL):
+        await self._command(servo_id, SERVO_MOVE_STOP)
+
+    async def get_position_offset(self, servo_id, timeout=None):
+        return _decode_position_offset(
+            await self._query(servo_id, SERVO_ANGLE_OFFSET_READ, timeout=timeout)
+        )
+
+    async def set_position_offset(self, servo_id, deviation):
+        await self._command(
+            servo_id, SERVO_ANGLE_OFFSET_ADJUST,
+            _encode_position_offset(clamp(-125, 125, deviation)),
+        )
+
+    async def save_position_offset(self, servo_id):
+        await self._command(servo_id, SERVO_ANGLE_OFFSET_WRITE)
+
+    async def get_position_limits(self, servo_id, timeout=None):
+        return _decode_words(
+            await self._query(servo_id, SERVO_ANGLE_LIMIT_READ, timeout=timeout)
+        )
+
+    async def set_position_limits(self, servo_id, min_position, max_position):
+        await self._command_words(
+            servo_id, SERVO_ANGLE_LIMIT_WRITE,
+            clamp(0, 1000, min_position), clamp(0, 1000, max_position),
+        )
+
+    async def get_voltage_limits(self, servo_id, timeout=None):
+        return _decode_words(
+            await self._query(servo_id, SERVO_VIN_LIMIT_READ, timeout=timeout)
+        )
+
+    async def set_voltage_limits(self, servo_id, min_voltage, max_voltage):
+        await self._command_words(
+            servo_id, SERVO_VIN_LIMIT_WRITE,
+            clamp(4500, 12000, min_voltage), clamp(4500, 12000, max_voltage),
+        )
+
+    async def get_max_temperature_limit(self, servo_id, timeout=None):
+        return _decode_byte(
+            await self._query(servo_id, SERVO_TEMP_MAX_LIMIT_READ, timeout=timeout)
+        )
+
+    async def set_max_temperature_limit(self, servo_id, max_temperature):
+        max_temperature = clamp(50, 100, max_temperature)
+        await self._command(servo_id, SERVO_TEMP_MAX_LIMIT_WRITE, max_temperature)
+
+    async def get_temperature(self, servo_id, timeout=None):
+        return _decode_temperature(
+            await self._query(servo_id, SERVO_TEMP_READ, timeout=timeout)
+        )
+
+    async def get_voltage(self, servo_id, timeout=None):
+        return _decode_voltage(
+            await self._query(servo_id, SERVO_VIN_READ, timeout=timeout)
+        )
+
+    async def get_position(self, servo_id, timeout=None):
+        return _decode_position(
+            await self._query(servo_id, SERVO_POS_READ, timeout=timeout)
+        )
+
+    async def get_mode(self, servo_id, timeout=None):
+        return _decode_mode(
+            await self._query(servo_id, SERVO_OR_MOTOR_MODE_READ, timeout=timeout)
+        )
+
+    async def get_motor_speed(self, servo_id, timeout=None):
+        return _decode_motor_speed(
+            await self._query(servo_id, SERVO_OR_MOTOR_MODE_READ, timeout=timeout)
+        )
+
+    async def set_servo_mode(self, servo_id):
+        await self._command_words(servo_id, SERVO_OR_MOTOR_MODE_WRITE, 0, 0)
+
+    async def set_motor_mode(self, servo_id, speed=0):
+        await self._command_words(
+            servo_id, SERVO_OR_MOTOR_MODE_WRITE, 1, clamp(-1000, 1000, speed),
+        )
+
+    async def is_motor_on(self, servo_id, timeout=None):
+        return _decode_motor_on(
+            await self._query(servo_id, SERVO_LOAD_OR_UNLOAD_READ, timeout=timeout)
+        )
+
+    async def motor_on(self, servo_id):
+        await self._command(servo_id, SERVO_LOAD_OR_UNLOAD_WRITE, 1)
+
+    async def motor_off(self, servo_id):
+        await self._command(servo_id, SERVO_LOAD_OR_UNLOAD_WRITE, 0)
+
+    async def is_led_on(self, servo_id, timeout=None):
+        return _decode_led_on(
+            await self._query(servo_id, SERVO_LED_CTRL_READ, timeout=timeout)
+        )
+
+    async def led_on(self, servo_id):
+        await self._command(servo_id, SERVO_LED_CTRL_WRITE, 0)
+
+    async def led_off(self, servo_id):
+        await self._command(servo_id, SERVO_LED_CTRL_WRITE, 1)
+
+    async def get_led_errors(self, servo_id, timeout=None):
+        return _decode_led_errors(
+            await self._query(servo_id, SERVO_LED_ERROR_READ, timeout=timeout)
+        )
+
+    async def set_led_errors(self, servo_id, error):
+        error = clamp(0, 7, error)
+        await self._command(servo_id, SERVO_LED_ERROR_WRITE, error)
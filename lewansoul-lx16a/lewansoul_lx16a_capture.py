@@ -0,0 +1,282 @@
+"""Binary capture and replay of servo bus traffic.
+
+Capture file is a memory-mapped ring buffer of records, each record is
+a chunk of data sent (TX) or received (RX) through serial port with
+its `time.monotonic()` timestamp. When file is full, oldest records are
+overwritten, so capture can run continuously:
+
+    capture = CaptureFile('bus.cap', size=16 * 1024 * 1024)
+    controller = lewansoul_lx16a.ServoController(serial, capture=capture)
+
+Recorded traffic can be read with `read_capture()` or replayed into
+servo controller with `ReplaySerial`:
+
+    controller = lewansoul_lx16a.ServoController(ReplaySerial('bus.cap'))
+"""
+
+__all__ = [
+    'CaptureFile',
+    'ReplaySerial',
+    'read_capture',
+    'TX',
+    'RX',
+]
+
+
+import mmap
+import os
+import struct
+import threading
+import time
+
+
+TX = 0
+RX = 1
+
+MAGIC = b'LX16ACAP'
+VERSION = 1
+
+# Magic, version, capacity, head offset, tail offset, used bytes
+_FILE_HEADER = struct.Struct('<8sIIQQQ')
+# Timestamp, direction, data length
+_RECORD_HEADER = struct.Struct('<dBH')
+_MAX_CHUNK = 0xffff
+
+
+class _Ring(object):
+    def __init__(self, buf, capacity):
+        self._buf = buf
+        self.capacity = capacity
+
+    def write(self, pos, data):
+        start = _FILE_HEADER.size + pos
+        end = pos + len(data)
+        if end <= self.capacity:
+            self._buf[start:start + len(data)] = data
+        else:
+            split = self.capacity - pos
+            self._buf[start:start + split] = data[:split]
+            self._buf[_FILE_HEADER.size:_FILE_HEADER.size + len(data) - split] = data[split:]
+
+    def read(self, pos, size):
+        start = _FILE_HEADER.size + pos
+        end = pos + size
+        if end <= self.capacity:
+            return bytes(self._buf[start:start + size])
+        split = self.capacity - pos
+        return (bytes(self._buf[start:start + split]) +
+                bytes(self._buf[_FILE_HEADER.size:_FILE_HEADER.size + size - split]))
+
+
+def _read_header(buf, path):
+    magic, version, capacity, head, tail, used = _FILE_HEADER.unpack_from(buf, 0)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError('%s is not a servo bus capture file' % path)
+    return capacity, head, tail, used
+
+
+class CaptureFile(object):
+    """Writer of servo bus capture file.
+
+    Existing capture file is opened for appending, otherwise new file
+    of given size is created.
+    """
+
+    def __init__(self, path, size=4 * 1024 * 1024):
+        """
+        Args:
+            path - capture file path
+            size - capacity of new capture file in bytes
+        """
+        self.path = path
+        self._lock = threading.Lock()
+
+        exists = os.path.exists(path) and os.path.getsize(path) > _FILE_HEADER.size
+        self._file = open(path, 'r+b' if exists else 'w+b')
+        if not exists:
+            self._file.truncate(_FILE_HEADER.size + size)
+
+        self._mmap = mmap.mmap(self._file.fileno(), 0)
+        if exists:
+            self._capacity, self._head, self._tail, self._used = \
+                _read_header(self._mmap, path)
+        else:
+            self._capacity, self._head, self._tail, self._used = size, 0, 0, 0
+            self._update_header()
+
+        self._ring = _Ring(self._mmap, self._capacity)
+        self._record_header = bytearray(_RECORD_HEADER.size)
+
+    def _update_header(self):
+        _FILE_HEADER.pack_into(
+            self._mmap, 0, MAGIC, VERSION,
+            self._capacity, self._head, self._tail, self._used,
+        )
+
+    def _evict(self):
+        _, _, size = _RECORD_HEADER.unpack(
+            self._ring.read(self._tail, _RECORD_HEADER.size)
+        )
+        size += _RECORD_HEADER.size
+        self._tail = (self._tail + size) % self._capacity
+        self._used -= size
+
+    def record(self, direction, data, timestamp=None):
+        """Appends record of data sent (TX) or received (RX)."""
+        if timestamp is None:
+            timestamp = time.monotonic()
+
+        for offset in range(0, len(data), _MAX_CHUNK):
+            chunk = data[offset:offset + _MAX_CHUNK]
+            size = _RECORD_HEADER.size + len(chunk)
+            if size > self._capacity:
+                return
+
+            with self._lock:
+                while self._used + size > self._capacity:
+                    self._evict()
+
+                _RECORD_HEADER.pack_into(
+                    self._record_header, 0, timestamp, direction, len(chunk),
+                )
+                self._ring.write(self._head, self._record_header)
+                self._ring.write(
+                    (self._head + _RECORD_HEADER.size) % self._capacity, chunk,
+                )
+                self._head = (self._head + size) % self._capacity
+                self._used += size
+                self._update_header()
+
+    def record_tx(self, data):
+        self.record(TX, data)
+
+    def record_rx(self, data):
+        self.record(RX, data)
+
+    def flush(self):
+        self._mmap.flush()
+
+    def close(self):
+        with self._lock:
+            if self._mmap is None:
+                return
+            self._mmap.flush()
+            self._mmap.close()
+            self._file.close()
+            self._mmap = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+def read_capture(path):
+    """Yields (timestamp, direction, data) tuples of records in capture
+    file from oldest to newest."""
+    with open(path, 'rb') as f:
+        buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            capacity, _, tail, used = _read_header(buf, path)
+            ring = _Ring(buf, capacity)
+            pos = tail
+            while used > 0:
+                timestamp, direction, size = _RECORD_HEADER.unpack(
+                    ring.read(pos, _RECORD_HEADER.size)
+                )
+                data = ring.read((pos + _RECORD_HEADER.size) % capacity, size)
+                yield timestamp, direction, data
+
+                pos = (pos + _RECORD_HEADER.size + size) % capacity
+                used -= _RECORD_HEADER.size + size
+        finally:
+            buf.close()
+
+
+class ReplaySerial(object):
+    """Serial port replaying received data from capture.
+
+    Replay clock starts on first write or read. Received data chunks
+    become available with the same relative timing as in capture,
+    scaled by `speed` (or immediately if `speed` is None). Written data
+    is discarded.
+    """
+
+    def __init__(self, capture, speed=1.0, timeout=None):
+        """
+        Args:
+            capture - capture file path or iterable of
+                (timestamp, direction, data) records
+            speed - replay speed multiplier (None for no delays)
+            timeout - initial read timeout
+        """
+        if isinstance(capture, str):
+            capture = read_capture(capture)
+
+        records = list(capture)
+        base = records[0][0] if records else 0.0
+        self._chunks = [
+            (timestamp - base, data)
+            for timestamp, direction, data in records if direction == RX
+        ]
+        self._next = 0
+        self._rx = bytearray()
+        self._started_at = None
+
+        self.speed = speed
+        self.timeout = timeout
+        self.is_open = True
+
+    def _now(self):
+        now = time.monotonic()
+        if self._started_at is None:
+            self._started_at = now
+        return now
+
+    def _due_at(self, idx):
+        if self.speed is None:
+            return self._started_at
+        return self._started_at + self._chunks[idx][0] / self.speed
+
+    def _deliver(self, now):
+        while self._next < len(self._chunks) and self._due_at(self._next) <= now:
+            self._rx += self._chunks[self._next][1]
+            self._next += 1
+
+    @property
+    def finished(self):
+        return self._next >= len(self._chunks) and not self._rx
+
+    @property
+    def in_waiting(self):
+        self._deliver(self._now())
+        return len(self._rx)
+
+    def write(self, data):
+        self._now()
+        return len(data)
+
+    def read(self, size=1):
+        now = self._now()
+        deadline = None if self.timeout is None else now + self.timeout
+        while True:
+            self._deliver(now)
+            if len(self._rx) >= size or self._next >= len(self._chunks):
+                break
+
+            wait = self._due_at(self._next) - now
+            if deadline is not None:
+                if now >= deadline:
+                    break
+                wait = min(wait, deadline - now)
+            if wait > 0:
+                time.sleep(wait)
+            now = time.monotonic()
+
+        data = bytes(self._rx[:size])
+        del self._rx[:size]
+        return data
+
+    def close(self):
+        self.is_open = False
@@ -9,6 +9,9 @@ from functools import partial
 from itertools import chain
 import threading
 import logging
+import time
+
+import lewansoul_lx16a
 
 
 CMD_SERVO_MOVE = 3
@@ -47,65 +50,129 @@ class TimeoutError(RuntimeError):
 LOGGER = logging.getLogger('lewansoul.servos.lx16a')
 
 
+class PacketDecoder(lewansoul_lx16a.PacketDecoder):
+    """Incremental decoder of servo controller packets.
+
+    Servo controller packets do not contain servo ID and checksum.
+    """
+    LENGTH_OFFSET = 2
+    MIN_LENGTH = 2
+    MAX_LENGTH = 255
+    CHECKSUM = False
+
+
 class ServoController(object):
-    def __init__(self, serial, timeout=1):
+    def __init__(self, serial, timeout=1, stats=False, cache=None):
+        """
+        Args:
+            serial - serial port (e.g. serial.Serial instance)
+            timeout - default query timeout in seconds
+            stats - if True, collect latency and traffic statistics
+                (see `stats()`)
+            cache - lewansoul_lx16a.ConfigurationCache with servo position
+                offsets used for conversion to degrees (controller can
+                not read them from servos, so they have to be put there
+                or read with bus `ServoController` sharing the cache)
+        """
         self._serial = serial
         self._timeout = timeout
+        self.cache = cache
         self._lock = threading.RLock()
         self._responses = []
+        self._decoder = PacketDecoder()
+        self._stats = lewansoul_lx16a.ControllerStats() if stats else None
+
+    def _acquire(self):
+        if self._stats is None:
+            self._lock.acquire()
+            return
+
+        start = time.perf_counter()
+        self._lock.acquire()
+        self._stats.lock_wait.observe(time.perf_counter() - start)
+
+    def _write(self, data):
+        """Writes data to serial port. Must be called with lock held."""
+        self._serial.write(data)
+        if self._stats is not None:
+            self._stats.bytes_sent += len(data)
+
+    def _send(self, command, *params):
+        """Writes command packet. Must be called with lock held."""
+        length = 2 + len(params)
+        LOGGER.debug('Sending servo control packet: %s', hex_data([
+            0x55, 0x55, length, command, *params
+        ]))
+        self._write(bytearray([
+            0x55, 0x55, length, command, *params
+        ]))
 
     def _command(self, command, *params):
-        length = 2 + len(params)
-        with self._lock:
-            LOGGER.debug('Sending servo control packet: %s', hex_data([
-                0x55, 0x55, length, command, *params
-            ]))
-            self._serial.write(bytearray([
-                0x55, 0x55, length, command, *params
-            ]))
+        self._acquire()
+        try:
+            self._send(command, *params)
+        finally:
+            self._lock.release()
+
+    def _read(self, timeout):
+        """Reads all available data (but at least enough to complete
+        next packet) into packet decoder."""
+        self._serial.timeout = timeout.time_left()
+        data = self._serial.read(
+            max(self._decoder.bytes_needed(), self._serial.in_waiting)
+        )
+        if not data:
+            raise TimeoutError()
+        if self._stats is not None:
+            self._stats.bytes_received += len(data)
+        self._decoder.feed(data)
 
     def _wait_for_response(self, command, timeout=None):
         timeout = Timeout(timeout or self._timeout)
 
-        def read(size=1):
-            self._serial.timeout = timeout.time_left()
-            data = self._serial.read(size)
-            if len(data) != size:
-                raise TimeoutError()
-            return data
-
         while True:
-            data = []
-            data += read(1)
-            if data[-1] != 0x55:
-                LOGGER.error(
-                    'Got unexpected octet while waiting for response header: %02x',
-                    data[-1]
-                )
-                continue
-            data += read(1)
-            if data[-1] != 0x55:
-                LOGGER.error(
-                    'Got unexpected octet while waiting for response header: %02x',
-                    data[-1]
-                )
-                continue
-            data += read(2)
-            length = data[2]
-            cmd = data[3]
-
-            data += read(length-2) if length > 2 else []
-            params = data[4:]
-
-            LOGGER.debug('Got command %s response: %s', cmd, hex_data(data))
-            self._responses.append([cmd] + params)
-
-            return params
+            for packet in self._decoder.decode():
+                cmd = packet[3]
+                params = list(packet[4:])
+
+                LOGGER.debug('Got command %s response: %s', cmd, hex_data(packet))
+                self._responses.append([cmd] + params)
+
+                return params
+
+            self._read(timeout)
 
     def _query(self, command, *params, timeout=None):
-        with self._lock:
-            self._command(command, *params)
-            return self._wait_for_response(command, timeout=timeout)
+        if self._stats is None:
+            with self._lock:
+                self._send(command, *params)
+                return self._wait_for_response(command, timeout=timeout)
+
+        start = time.perf_counter()
+        self._acquire()
+        try:
+            self._send(command, *params)
+            response = self._wait_for_response(command, timeout=timeout)
+        except TimeoutError:
+            self._stats.timeouts[command] += 1
+            raise
+        finally:
+            self._lock.release()
+        self._stats.observe_query(None, command, time.perf_counter() - start)
+        return response
+
+    def stats(self):
+        """Returns snapshot of controller statistics.
+
+        Latency and traffic statistics are available only if controller
+        was created with `stats=True`.
+        """
+        result = {
+            'skipped_bytes': self._decoder.skipped_bytes,
+        }
+        if self._stats is not None:
+            result.update(self._stats.snapshot())
+        return result
 
     def move(self, positions, time=0):
         """Command multiple servos to move to given positions in given time.
@@ -142,6 +209,94 @@ class ServoController(object):
             for i in range(response[0])
         }
 
+    def position_offsets_array(self, servo_ids):
+        """Returns NumPy array of position offsets (in ticks) of servos
+        with given IDs taken from configuration cache (0 for servos
+        without cached offset)."""
+        import numpy as np
+
+        offsets = np.zeros(len(servo_ids))
+        if self.cache is not None:
+            for idx, servo_id in enumerate(servo_ids):
+                try:
+                    offsets[idx] = self.cache.get(int(servo_id), 'position_offset')
+                except KeyError:
+                    pass
+        return offsets
+
+    def move_array(self, servo_ids, positions, time=0, degrees=False):
+        """Command multiple servos to move to positions given as arrays.
+
+        Same as `move`, but clamping and packing are done with vectorized
+        NumPy operations.
+
+        Args:
+            servo_ids - sequence or array of servo IDs
+            positions - array of positions (in degrees from center
+                position if `degrees` is True)
+            time - int number of milliseconds for move
+            degrees - if True, positions are converted from degrees using
+                each servo's position offset (see `position_offsets_array`)
+        """
+        import numpy as np
+
+        if degrees:
+            positions = lewansoul_lx16a.degrees_to_ticks(
+                np.asarray(positions, dtype=np.float64),
+                self.position_offsets_array(servo_ids),
+            )
+
+        servo_ids = np.asarray(servo_ids, dtype=np.uint8)
+        count = len(servo_ids)
+        positions = np.broadcast_to(
+            np.clip(np.rint(positions), 0, 10000).astype(np.uint16), (count,))
+        time = clamp(0, 30000, time)
+
+        packet = np.empty(7 + 3 * count, dtype=np.uint8)
+        packet[:7] = (0x55, 0x55, 5 + 3 * count, CMD_SERVO_MOVE, count,
+                      lower_byte(time), higher_byte(time))
+        params = packet[7:].reshape(count, 3)
+        params[:, 0] = servo_ids
+        params[:, 1] = positions & 0xff
+        params[:, 2] = positions >> 8
+
+        self._acquire()
+        try:
+            if LOGGER.isEnabledFor(logging.DEBUG):
+                LOGGER.debug('Sending servo control packet: %s', hex_data(packet))
+            self._write(packet.tobytes())
+        finally:
+            self._lock.release()
+
+    def read_positions_array(self, servo_ids, degrees=False):
+        """Reads positions of servos with given IDs into NumPy array.
+
+        Args:
+            servo_ids - sequence or array of servo IDs
+            degrees - if True, positions are converted to degrees from
+                center position using each servo's position offset (see
+                `position_offsets_array`)
+
+        Returns:
+            float array of positions in order of servo IDs, with NaN for
+            servos missing in controller response
+        """
+        import numpy as np
+
+        servo_ids = np.asarray(servo_ids, dtype=np.uint8)
+        response = self._query(CMD_MULT_SERVO_POS_READ, len(servo_ids), *servo_ids.tolist())
+        entries = np.frombuffer(bytes(response[1:1 + 3 * response[0]]), dtype=np.uint8)
+        entries = entries.reshape(-1, 3)
+
+        by_id = np.full(256, np.nan)
+        by_id[entries[:, 0]] = entries[:, 1] + entries[:, 2].astype(np.float64) * 256
+        positions = by_id[servo_ids]
+        if degrees:
+            positions = lewansoul_lx16a.ticks_to_degrees(
+                positions, self.position_offsets_array(servo_ids),
+            )
+        return positions
+
     def unload(self, servo_ids):
         """Switches off motors of servos with given IDs.
 
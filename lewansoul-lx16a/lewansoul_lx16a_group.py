@@ -0,0 +1,229 @@
+__all__ = [
+    'ServoBusGroup',
+]
+
+
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack
+import threading
+
+from lewansoul_lx16a import (
+    SERVO_ID_ALL, SERVO_MOVE_START, SERVO_MOVE_STOP,
+    PRIORITY_EMERGENCY, PRIORITY_MOTION, encode_packet,
+)
+
+
+_MOVE_START_PACKET = bytes(encode_packet(SERVO_ID_ALL, SERVO_MOVE_START))
+_MOVE_STOP_PACKET = bytes(encode_packet(SERVO_ID_ALL, SERVO_MOVE_STOP))
+
+
+class ServoBusGroup(object):
+    """Group of servo buses (each with its own serial port and
+    `lewansoul_lx16a.ServoController`) working as one.
+
+    Each bus has a dedicated worker thread. Batched queries and moves are
+    split by bus, run on all buses concurrently and their results merged.
+
+    Example:
+
+        group = ServoBusGroup({
+            'left': ServoController(serial.Serial('/dev/ttyUSB0', 115200)),
+            'right': ServoController(serial.Serial('/dev/ttyUSB1', 115200)),
+        })
+        group.discover()
+        print(group.get_positions([1, 2, 3, 11, 12, 13]))
+        group.move_many({1: (500, 1000), 11: (500, 1000)})
+    """
+
+    def __init__(self, controllers, servo_map=None):
+        """
+        Args:
+            controllers - dict mapping bus name to ServoController
+                (or list of ServoControllers, then bus names are list indexes)
+            servo_map - dict mapping servo ID to bus name
+        """
+        if not isinstance(controllers, dict):
+            controllers = dict(enumerate(controllers))
+
+        self._controllers = controllers
+        self._servo_map = dict(servo_map or {})
+        self._lock = threading.Lock()
+        # Buses with moves prepared by `move_many`
+        self._prepared = set()
+        self._workers = {
+            bus: ThreadPoolExecutor(max_workers=1, thread_name_prefix='lx16a-bus-%s' % bus)
+            for bus in controllers
+        }
+
+    @property
+    def buses(self):
+        return list(self._controllers)
+
+    @property
+    def servo_map(self):
+        return dict(self._servo_map)
+
+    def controller(self, bus):
+        return self._controllers[bus]
+
+    def bus_of(self, servo_id):
+        try:
+            return self._servo_map[servo_id]
+        except KeyError:
+            raise KeyError('Servo %s is not assigned to any bus' % servo_id)
+
+    def assign(self, servo_id, bus):
+        if bus not in self._controllers:
+            raise KeyError('Unknown bus %s' % bus)
+        with self._lock:
+            self._servo_map[servo_id] = bus
+
+    def servo(self, servo_id):
+        return self._controllers[self.bus_of(servo_id)].servo(servo_id)
+
+    def close(self):
+        for worker in self._workers.values():
+            worker.shutdown()
+
+    def _run_on_buses(self, calls):
+        """Runs calls on their bus workers concurrently.
+
+        Args:
+            calls - dict mapping bus name to function taking controller
+
+        Returns:
+            dict mapping bus name to call result
+        """
+        futures = {
+            bus: self._workers[bus].submit(call, self._controllers[bus])
+            for bus, call in calls.items()
+        }
+        return {bus: future.result() for bus, future in futures.items()}
+
+    def _split(self, items):
+        by_bus = {}
+        for servo_id, value in items:
+            by_bus.setdefault(self.bus_of(servo_id), []).append((servo_id, value))
+        return by_bus
+
+    def discover(self, **kwargs):
+        """Scans all buses concurrently and assigns found servos to buses.
+
+        Arguments are passed to `ServoController.scan`.
+
+        Returns:
+            dict mapping servo ID to bus name
+        """
+        found = self._run_on_buses({
+            bus: lambda controller: list(controller.scan(**kwargs))
+            for bus in self._controllers
+        })
+        with self._lock:
+            for bus, servo_ids in found.items():
+                for servo_id in servo_ids:
+                    self._servo_map[servo_id] = bus
+        return self.servo_map
+
+    def query_many(self, queries, timeout=None, cancel=None):
+        """Runs queries on all buses concurrently.
+
+        Args:
+            queries - list of (servo_id, command) tuples
+            cancel - optional CancellationToken to abort queries on all buses
+
+        Returns:
+            dict mapping (servo_id, command) to response data or
+            TimeoutError instance (see `ServoController.query_many`)
+        """
+        by_bus = self._split(queries)
+        results = self._run_on_buses({
+            bus: lambda controller, queries=bus_queries: controller.query_many(
+                queries, timeout=timeout, cancel=cancel,
+            )
+            for bus, bus_queries in by_bus.items()
+        })
+
+        merged = {}
+        for bus_results in results.values():
+            merged.update(bus_results)
+        return {query: merged[query] for query in queries}
+
+    def _get_many(self, method, servo_ids, timeout):
+        by_bus = self._split((servo_id, None) for servo_id in servo_ids)
+        results = self._run_on_buses({
+            bus: lambda controller, ids=[servo_id for servo_id, _ in items]:
+                getattr(controller, method)(ids, timeout=timeout)
+            for bus, items in by_bus.items()
+        })
+
+        merged = {}
+        for bus_results in results.values():
+            merged.update(bus_results)
+        return {servo_id: merged[servo_id] for servo_id in servo_ids}
+
+    def get_positions(self, servo_ids, timeout=None):
+        return self._get_many('get_positions', servo_ids, timeout)
+
+    def get_temperatures(self, servo_ids, timeout=None):
+        return self._get_many('get_temperatures', servo_ids, timeout)
+
+    def get_voltages(self, servo_ids, timeout=None):
+        return self._get_many('get_voltages', servo_ids, timeout)
+
+    def move_many(self, moves, start=True):
+        """Synchronously moves servos on all buses.
+
+        Moves are prepared on all buses concurrently, then move start
+        command is sent to all buses back-to-back (see `move_start`).
+
+        Args:
+            moves - dict mapping servo ID to (position, time) tuple
+            start - if False, only prepare moves
+        """
+        by_bus = self._split(moves.items())
+        self._run_on_buses({
+            bus: lambda controller, bus_moves=dict(items): controller.move_many(
+                bus_moves, start=False,
+            )
+            for bus, items in by_bus.items()
+        })
+        with self._lock:
+            self._prepared.update(by_bus)
+        if start:
+            self.move_start()
+
+    def _write_to_buses(self, buses, data, priority):
+        """Acquires all given buses first (in bus order, so that
+        concurrent calls do not deadlock), then writes data to them one
+        right after another."""
+        controllers = [
+            controller for bus, controller in self._controllers.items()
+            if bus in buses
+        ]
+        with ExitStack() as stack:
+            for controller in controllers:
+                stack.enter_context(controller.hold_bus(priority))
+            for controller in controllers:
+                controller.write_frames(data, priority)
+
+    def move_start(self, buses=None):
+        """Starts prepared moves.
+
+        All buses are acquired before pre-encoded start commands are
+        written one right after another, so that a bus busy with a query
+        does not delay start on other buses.
+
+        Args:
+            buses - names of buses to start moves on (by default, buses
+                with moves prepared by `move_many`)
+        """
+        with self._lock:
+            if buses is None:
+                buses = set(self._prepared)
+            self._prepared.difference_update(buses)
+        if buses:
+            self._write_to_buses(buses, _MOVE_START_PACKET, PRIORITY_MOTION)
+
+    def move_stop(self):
+        """Stops moves on all buses (see `move_start`)."""
+        self._write_to_buses(self._controllers, _MOVE_STOP_PACKET, PRIORITY_EMERGENCY)
@@ -0,0 +1,661 @@
+"""Network server sharing one servo bus between many client processes.
+
+Server owns serial port (through `lewansoul_lx16a.ServoController`) and
+accepts clients on TCP or Unix socket:
+
+    python lewansoul_lx16a_server.py --port /dev/ttyUSB0 --listen localhost:7016
+
+Clients use `RemoteServoController` which has the same API as
+`ServoController`:
+
+    controller = RemoteServoController(('localhost', 7016))
+    controller.move(1, 500, 1000)
+    print(controller.get_position(1))
+
+Requests of all clients are taken in round-robin order, up to `burst`
+requests of each client per round. Commands (methods that do not return
+a value) of a round are executed first and sent as one batch (see
+`ServoController.batch`), so bursts of commands end up in a single
+write. Commands are not acknowledged, so clients can stream them
+without waiting for round trips.
+
+Queries of a round are then handed over to a query worker and answered
+as soon as they complete. As commands do not wait for queries, a move
+or stop of one client makes a query of another client that is waiting
+for a missing servo give up bus (see `BusScheduler.should_yield`).
+Long running queries (LONG_QUERIES, e.g. `scan`) are executed by yet
+another worker, so they do not hold back other queries (they still
+share the bus query by query).
+
+Commands sent inside `RemoteServoController.batch()` are sent to
+server with a single write.
+
+Telemetry subscriptions are served from one shared poller (see
+`lewansoul_lx16a_telemetry.TelemetryPoller`) no matter how many clients
+subscribe.
+
+Messages are JSON objects, one per line.
+"""
+
+__all__ = [
+    'BusServer',
+    'RemoteServoController',
+]
+
+
+from collections import deque
+from contextlib import contextmanager
+from functools import partial
+import argparse
+import concurrent.futures
+import itertools
+import json
+import os
+import socket
+import threading
+import types
+
+import lewansoul_lx16a
+from lewansoul_lx16a import TimeoutError, CancelledError, LOGGER
+from lewansoul_lx16a_telemetry import TelemetryPoller, TelemetrySnapshot
+
+
+#: ServoController methods that do not return a value
+COMMANDS = frozenset([
+    'set_servo_id', 'move', 'move_prepare', 'move_many', 'move_array',
+    'move_start', 'move_stop', 'set_position_offset', 'save_position_offset',
+    'set_position_limits', 'set_voltage_limits', 'set_max_temperature_limit',
+    'set_servo_mode', 'set_motor_mode', 'motor_on', 'motor_off',
+    'led_on', 'led_off', 'set_led_errors',
+])
+
+#: ServoController methods returning a value
+QUERIES = frozenset([
+    'get_servo_id', 'get_prepared_move', 'get_position_offset',
+    'get_position_limits', 'get_voltage_limits', 'get_max_temperature_limit',
+    'get_temperature', 'get_voltage', 'get_position', 'get_mode',
+    'get_motor_speed', 'is_motor_on', 'is_led_on', 'get_led_errors',
+    'query_many', 'get_positions', 'get_temperatures', 'get_voltages',
+    'read_positions_array', 'scan', 'refresh_configuration', 'stats',
+])
+
+METHODS = COMMANDS | QUERIES
+
+#: Queries that can keep bus busy for long, executed by separate worker
+LONG_QUERIES = frozenset(['scan', 'refresh_configuration'])
+
+_ERRORS = {
+    'TimeoutError': TimeoutError,
+    'CancelledError': CancelledError,
+    'ValueError': ValueError,
+    'TypeError': TypeError,
+    'KeyError': KeyError,
+}
+
+
+def _encode(value):
+    """Converts value to JSON compatible form preserving tuples, dicts
+    with non-string keys and timeout errors."""
+    if value is None or isinstance(value, (bool, int, float, str)):
+        return value
+    if isinstance(value, TimeoutError):
+        return {'__error__': 'TimeoutError'}
+    if isinstance(value, tuple):
+        return {'__tuple__': [_encode(item) for item in value]}
+    if isinstance(value, dict):
+        return {'__dict__': [[_encode(k), _encode(v)] for k, v in value.items()]}
+    if isinstance(value, (list, range, set, frozenset)):
+        return [_encode(item) for item in value]
+    if hasattr(value, 'tolist'):
+        # NumPy arrays and scalars
+        return _encode(value.tolist())
+    raise TypeError('Cannot send %r to bus server' % (value,))
+
+
+def _decode(value):
+    if isinstance(value, list):
+        return [_decode(item) for item in value]
+    if isinstance(value, dict):
+        if '__tuple__' in value:
+            return tuple(_decode(item) for item in value['__tuple__'])
+        if '__dict__' in value:
+            return {_decode(k): _decode(v) for k, v in value['__dict__']}
+        if '__error__' in value:
+            return _ERRORS.get(value['__error__'], RuntimeError)()
+    return value
+
+
+def _dump(message):
+    return (json.dumps(message) + '\n').encode('utf-8')
+
+
+def _parse_address(address):
+    """Parses 'host:port' string to tuple, other strings are Unix socket paths."""
+    if isinstance(address, str) and ':' in address and not address.startswith('/'):
+        host, port = address.rsplit(':', 1)
+        return host, int(port)
+    return address
+
+
+def _connect(address):
+    if isinstance(address, str):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.connect(address)
+    else:
+        sock = socket.create_connection(address)
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+    return sock
+
+
+class _Client(object):
+    def __init__(self, sock, name):
+        self.sock = sock
+        self.name = name
+        self.requests = deque()
+        self.subscription = None
+        self._send_lock = threading.Lock()
+
+    def send(self, message):
+        data = _dump(message)
+        with self._send_lock:
+            try:
+                self.sock.sendall(data)
+            except OSError:
+                pass
+
+    def close(self):
+        try:
+            self.sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self.sock.close()
+
+
+class BusServer(object):
+    """Server multiplexing many clients onto one servo bus."""
+
+    ACCEPT_POLL_INTERVAL = 0.1
+
+    def __init__(self, controller, address, poller=None, rates=None, burst=8):
+        """
+        Args:
+            controller - lewansoul_lx16a.ServoController instance
+            address - (host, port) tuple to listen on TCP socket or
+                path of Unix socket
+            poller - TelemetryPoller used to serve telemetry
+                subscriptions (by default, one is created with `rates`)
+            rates - telemetry sampling rates (see TelemetryPoller)
+            burst - maximum number of requests of each client to execute
+                in one round
+        """
+        self.controller = controller
+        self._address = address
+        self.burst = burst
+        self._own_poller = poller is None
+        self.poller = poller or TelemetryPoller(controller, rates=rates)
+
+        self._sock = None
+        self._clients = []
+        self._condition = threading.Condition()
+        self._stop = threading.Event()
+        self._threads = []
+        self._query_worker = None
+        self._long_worker = None
+        self._cancel = lewansoul_lx16a.CancellationToken()
+
+        self.rounds = 0
+        self.requests = 0
+
+    @property
+    def address(self):
+        """Address server is listening on (e.g. to find out port number
+        when listening on port 0)."""
+        return self._sock.getsockname()
+
+    def start(self):
+        if isinstance(self._address, str):
+            if os.path.exists(self._address):
+                os.unlink(self._address)
+            self._sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        else:
+            self._sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            self._sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self._sock.bind(self._address)
+        self._sock.listen()
+        self._sock.settimeout(self.ACCEPT_POLL_INTERVAL)
+
+        self._stop.clear()
+        self._cancel = lewansoul_lx16a.CancellationToken()
+        self._query_worker = concurrent.futures.ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix='lx16a-server-query',
+        )
+        self._long_worker = concurrent.futures.ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix='lx16a-server-long',
+        )
+        self.poller.subscribe(self._on_telemetry)
+        if self._own_poller:
+            self.poller.start()
+
+        for target, name in [(self._accept_loop, 'lx16a-server-accept'),
+                             (self._dispatch_loop, 'lx16a-server-bus')]:
+            thread = threading.Thread(target=target, name=name, daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self):
+        self._stop.set()
+        # Abort scans in progress
+        self._cancel.cancel()
+        with self._condition:
+            self._condition.notify_all()
+            clients, self._clients = self._clients, []
+        for client in clients:
+            client.close()
+        for thread in self._threads:
+            thread.join()
+        self._threads = []
+        for worker in [self._query_worker, self._long_worker]:
+            worker.shutdown()
+        self._query_worker = None
+        self._long_worker = None
+
+        self.poller.unsubscribe(self._on_telemetry)
+        if self._own_poller:
+            self.poller.stop()
+
+        self._sock.close()
+        if isinstance(self._address, str) and os.path.exists(self._address):
+            os.unlink(self._address)
+
+    def serve_forever(self):
+        self.start()
+        try:
+            self._stop.wait()
+        finally:
+            self.stop()
+
+    def _accept_loop(self):
+        while not self._stop.is_set():
+            try:
+                sock, peer = self._sock.accept()
+            except socket.timeout:
+                continue
+            except OSError:
+                break
+
+            sock.settimeout(None)
+            if sock.family != socket.AF_UNIX:
+                sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            client = _Client(sock, peer or 'unix')
+            LOGGER.info('Bus server client %s connected', client.name)
+            with self._condition:
+                self._clients.append(client)
+            threading.Thread(
+                target=self._client_loop, args=(client,),
+                name='lx16a-server-client', daemon=True,
+            ).start()
+
+    def _client_loop(self, client):
+        buffer = b''
+        try:
+            while True:
+                data = client.sock.recv(65536)
+                if not data:
+                    break
+
+                # Requests received together (e.g. client batch) are
+                # queued together to be executed in the same round
+                lines = (buffer + data).split(b'\n')
+                buffer = lines.pop()
+                requests = []
+                for line in lines:
+                    try:
+                        request = json.loads(line.decode('utf-8'))
+                    except ValueError:
+                        LOGGER.error('Invalid request from %s: %r', client.name, line)
+                        continue
+
+                    if request.get('method') == 'subscribe':
+                        self._subscribe(client, request)
+                        continue
+
+                    requests.append(request)
+
+                if requests:
+                    with self._condition:
+                        client.requests.extend(requests)
+                        self._condition.notify()
+        except OSError:
+            pass
+        finally:
+            with self._condition:
+                if client in self._clients:
+                    self._clients.remove(client)
+            client.close()
+            LOGGER.info('Bus server client %s disconnected', client.name)
+
+    def _next_round(self):
+        """Waits for requests and takes up to `burst` requests of each
+        client interleaved round-robin."""
+        with self._condition:
+            while not self._stop.is_set():
+                if any(client.requests for client in self._clients):
+                    break
+                self._condition.wait()
+            else:
+                return []
+
+            batch = []
+            for _ in range(self.burst):
+                for client in self._clients:
+                    if client.requests:
+                        batch.append((client, client.requests.popleft()))
+
+            # Let next client go first in next round
+            if len(self._clients) > 1:
+                self._clients.append(self._clients.pop(0))
+            return batch
+
+    def _dispatch_loop(self):
+        while not self._stop.is_set():
+            batch = self._next_round()
+            if not batch:
+                continue
+
+            # Commands go first, so they are not held back by queries
+            # (unknown methods are answered by query worker)
+            queries = []
+            replies = []
+            with self.controller.batch():
+                for client, request in batch:
+                    if request.get('method') not in COMMANDS:
+                        queries.append((client, request))
+                        continue
+
+                    reply = self._execute(request)
+                    if reply is not None:
+                        replies.append((client, reply))
+
+            for client, request in queries:
+                if request.get('method') in LONG_QUERIES:
+                    self._submit(self._long_worker, client, request, self._cancel)
+                else:
+                    self._submit(self._query_worker, client, request)
+
+            self.rounds += 1
+            self.requests += len(batch)
+            for client, reply in replies:
+                client.send(reply)
+
+    def _submit(self, worker, client, request, cancel=None):
+        def send_reply(future):
+            reply = future.result()
+            if reply is not None:
+                client.send(reply)
+
+        future = worker.submit(self._execute, request, cancel)
+        future.add_done_callback(send_reply)
+
+    def _execute(self, request, cancel=None):
+        request_id = request.get('id')
+        method = request.get('method')
+        try:
+            if method not in METHODS:
+                raise ValueError('Unknown method %s' % method)
+            args = _decode(request.get('args', []))
+            kwargs = _decode(request.get('kwargs', {}))
+            if cancel is not None and method == 'scan':
+                kwargs['cancel'] = cancel
+
+            result = getattr(self.controller, method)(*args, **kwargs)
+            if isinstance(result, types.GeneratorType):
+                result = list(result)
+            if request_id is None:
+                return None
+            return {'id': request_id, 'result': _encode(result)}
+        except Exception as e:
+            if request_id is None:
+                LOGGER.warning('Command %s failed: %s', method, e)
+            return {
+                'id': request_id, 'method': method,
+                'error': type(e).__name__, 'message': str(e),
+            }
+
+    def _subscribe(self, client, request):
+        servo_ids = request.get('servo_ids')
+        if servo_ids is not None:
+            servo_ids = set(servo_ids)
+            for servo_id in servo_ids:
+                self.poller.add_servo(servo_id)
+        client.subscription = servo_ids if servo_ids is not None else True
+        client.send({'id': request.get('id'), 'result': None})
+
+    def _on_telemetry(self, snapshot):
+        with self._condition:
+            clients = [client for client in self._clients if client.subscription]
+
+        for client in clients:
+            values = snapshot.values
+            if client.subscription is not True:
+                values = {
+                    servo_id: fields for servo_id, fields in values.items()
+                    if servo_id in client.subscription
+                }
+            if values:
+                client.send({
+                    'event': 'telemetry', 'timestamp': snapshot.timestamp,
+                    'values': _encode(values),
+                })
+
+
+class RemoteServoController(object):
+    """Client of `BusServer` with the same API as
+    `lewansoul_lx16a.ServoController`.
+
+    Commands are sent without waiting for server, queries block until
+    response is received. Keyword arguments that can not be sent over
+    network (e.g. `retry` or `cancel`) are not supported.
+
+    Like with `ServoController`, commands sent inside `batch()` are
+    buffered and sent with a single write.
+    """
+
+    def __init__(self, address, timeout=10):
+        """
+        Args:
+            address - (host, port) tuple of TCP server, 'host:port'
+                string or path of Unix socket
+            timeout - maximum time in seconds to wait for query response
+        """
+        self.timeout = timeout
+        self._sock = _connect(_parse_address(address))
+        self._send_lock = threading.Lock()
+        self._pending = {}
+        self._pending_lock = threading.Lock()
+        self._ids = itertools.count(1)
+        self._subscribers = []
+        # Per thread batch depth and buffer (see `batch()`)
+        self._local = threading.local()
+
+        self._reader = threading.Thread(
+            target=self._reader_loop, name='lx16a-client', daemon=True,
+        )
+        self._reader.start()
+
+    def __getattr__(self, name):
+        if name not in METHODS:
+            raise AttributeError(name)
+        return partial(self._call, name)
+
+    def servo(self, servo_id):
+        return lewansoul_lx16a.Servo(self, servo_id)
+
+    def _write(self, data):
+        with self._send_lock:
+            self._sock.sendall(data)
+
+    def _send(self, message, flush=True):
+        """Sends message to server. Inside `batch()`, message is
+        buffered and (if `flush` is True) sent together with buffer."""
+        data = _dump(message)
+        batch = getattr(self._local, 'batch', None)
+        if batch is not None:
+            batch += data
+            if not flush:
+                return
+            data = bytes(batch)
+            del batch[:]
+        self._write(data)
+
+    def flush(self):
+        """Sends commands buffered by current thread's `batch()`."""
+        batch = getattr(self._local, 'batch', None)
+        if batch:
+            data = bytes(batch)
+            del batch[:]
+            self._write(data)
+
+    @contextmanager
+    def batch(self):
+        """Returns context manager that buffers commands sent inside it
+        and sends them to server with a single write on exit.
+
+        Buffer is also sent before any query (together with query).
+        Batches are per thread and can be nested, buffer is sent when
+        outermost batch exits.
+        """
+        local = self._local
+        depth = getattr(local, 'depth', 0)
+        if depth == 0:
+            local.batch = bytearray()
+        local.depth = depth + 1
+        try:
+            yield self
+        finally:
+            local.depth -= 1
+            if local.depth == 0:
+                try:
+                    self.flush()
+                finally:
+                    local.batch = None
+
+    def _call(self, method, *args, **kwargs):
+        message = {'method': method, 'args': _encode(args), 'kwargs': _encode(kwargs)}
+        if method in COMMANDS:
+            self._send(message, flush=False)
+            return None
+
+        result = self._request(message)
+        if method == 'scan':
+            return iter(result)
+        if method == 'read_positions_array':
+            import numpy as np
+            return np.array(result, dtype=np.float64)
+        return result
+
+    def _request(self, message):
+        future = concurrent.futures.Future()
+        with self._pending_lock:
+            message['id'] = request_id = next(self._ids)
+            self._pending[request_id] = future
+        try:
+            self._send(message)
+            return future.result(self.timeout)
+        except concurrent.futures.TimeoutError:
+            raise TimeoutError('No response from bus server')
+        finally:
+            with self._pending_lock:
+                self._pending.pop(request_id, None)
+
+    def subscribe(self, callback, servo_ids=None):
+        """Subscribes to telemetry polled by server.
+
+        Args:
+            callback - function called with TelemetrySnapshot from
+                client reader thread
+            servo_ids - IDs of servos to receive telemetry of (and add
+                to server poller), None for all polled servos
+        """
+        self._subscribers.append(callback)
+        self._request({
+            'method': 'subscribe',
+            'servo_ids': None if servo_ids is None else list(servo_ids),
+        })
+
+    def _reader_loop(self):
+        try:
+            for line in self._sock.makefile('rb'):
+                self._handle(json.loads(line.decode('utf-8')))
+        except (OSError, ValueError) as e:
+            LOGGER.error('Bus server connection failed: %s', e)
+        finally:
+            with self._pending_lock:
+                pending, self._pending = self._pending, {}
+            for future in pending.values():
+                if not future.done():
+                    future.set_exception(TimeoutError('Bus server connection closed'))
+
+    def _handle(self, message):
+        if message.get('event') == 'telemetry':
+            snapshot = TelemetrySnapshot(
+                timestamp=message['timestamp'], values=_decode(message['values']),
+            )
+            for callback in list(self._subscribers):
+                try:
+                    callback(snapshot)
+                except Exception:
+                    LOGGER.exception('Telemetry subscriber failed')
+            return
+
+        if 'error' in message:
+            error = _ERRORS.get(message['error'], RuntimeError)(message.get('message'))
+            if message.get('id') is None:
+                LOGGER.error('Command %s failed on bus server: %s',
+                             message.get('method'), error)
+                return
+        with self._pending_lock:
+            future = self._pending.get(message.get('id'))
+        if future is None:
+            return
+        if 'error' in message:
+            future.set_exception(error)
+        else:
+            future.set_result(_decode(message['result']))
+
+    def close(self):
+        try:
+            self._sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self._sock.close()
+        self._reader.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+def main():
+    import logging
+    import serial
+
+    parser = argparse.ArgumentParser(description='LewanSoul LX-16A servo bus server')
+    parser.add_argument('--port', required=True, help='serial port of servo bus')
+    parser.add_argument('--baudrate', type=int, default=115200)
+    parser.add_argument('--listen', default='localhost:7016',
+                        help='host:port to listen on or path of Unix socket')
+    parser.add_argument('--echo', action='store_true',
+                        help='serial adapter echoes sent data')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    controller = lewansoul_lx16a.ServoController(
+        serial.Serial(args.port, args.baudrate, timeout=1), echo=args.echo,
+    )
+    BusServer(controller, _parse_address(args.listen)).serve_forever()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,382 @@
+"""Simulated LewanSoul LX-16A servo bus.
+
+Simulated ports implement subset of pyserial `Serial` interface used by
+servo controllers (`read`, `write`, `in_waiting`, `timeout`) and can be
+used to run code and measure library overhead without hardware:
+
+    bus = SimulatedBus([SimulatedServo(1), SimulatedServo(2)])
+    controller = lewansoul_lx16a.ServoController(bus)
+    controller.move(1, 500, 1000)
+    print(controller.get_position(1))
+"""
+
+__all__ = [
+    'SimulatedServo',
+    'SimulatedBus',
+    'SimulatedControllerBoard',
+]
+
+
+import random
+import threading
+import time
+
+import lewansoul_lx16a as lx16a
+import lewansoul_lx16a_controller as lx16a_controller
+from lewansoul_lx16a import lower_byte, higher_byte, word, clamp
+
+
+def _signed(value, bits):
+    return value - (1 << bits) if value >= (1 << (bits - 1)) else value
+
+
+def _unsigned(value, bits):
+    return value + (1 << bits) if value < 0 else value
+
+
+class SimulatedServo(object):
+    """Registers and motion model of a single LX-16A servo."""
+
+    def __init__(self, servo_id=1, position=500, voltage=7400, temperature=35):
+        self.servo_id = servo_id
+        self.voltage = voltage
+        self.temperature = temperature
+        self.position_offset = 0
+        self.saved_position_offset = 0
+        self.position_limits = (0, 1000)
+        self.voltage_limits = (4500, 12000)
+        self.max_temperature = 85
+        self.mode = 0
+        self.speed = 0
+        self.motor_on = False
+        self.led_on = True
+        self.led_errors = 0
+        self.prepared_move = None
+
+        self._move = (position, position, 0.0, 0.0)  # from, to, start, duration
+
+    def position_at(self, now):
+        start_position, target, start, duration = self._move
+        if duration <= 0 or now >= start + duration:
+            return target
+        k = (now - start) / duration
+        return int(round(start_position + (target - start_position) * k))
+
+    @property
+    def position(self):
+        return self.position_at(time.monotonic())
+
+    def move(self, position, duration, now):
+        min_position, max_position = self.position_limits
+        position = clamp(min_position, max_position, position)
+        self._move = (self.position_at(now), position, now, duration / 1000.0)
+        self.motor_on = True
+
+    def stop(self, now):
+        position = self.position_at(now)
+        self._move = (position, position, now, 0.0)
+
+    def handle(self, command, params, now):
+        """Executes command and returns list of response parameters
+        or None if command has no response."""
+        if command == lx16a.SERVO_MOVE_TIME_WRITE:
+            self.move(word(params[0], params[1]), word(params[2], params[3]), now)
+        elif command == lx16a.SERVO_MOVE_TIME_READ:
+            _, target, _, duration = self._move
+            duration = int(duration * 1000)
+            return [lower_byte(target), higher_byte(target),
+                    lower_byte(duration), higher_byte(duration)]
+        elif command == lx16a.SERVO_MOVE_TIME_WAIT_WRITE:
+            self.prepared_move = (word(params[0], params[1]), word(params[2], params[3]))
+        elif command == lx16a.SERVO_MOVE_TIME_WAIT_READ:
+            position, duration = self.prepared_move or (0, 0)
+            return [lower_byte(position), higher_byte(position),
+                    lower_byte(duration), higher_byte(duration)]
+        elif command == lx16a.SERVO_MOVE_START:
+            if self.prepared_move is not None:
+                self.move(self.prepared_move[0], self.prepared_move[1], now)
+                self.prepared_move = None
+        elif command == lx16a.SERVO_MOVE_STOP:
+            self.stop(now)
+        elif command == lx16a.SERVO_ID_WRITE:
+            self.servo_id = params[0]
+        elif command == lx16a.SERVO_ID_READ:
+            return [self.servo_id]
+        elif command == lx16a.SERVO_ANGLE_OFFSET_ADJUST:
+            self.position_offset = _signed(params[0], 8)
+        elif command == lx16a.SERVO_ANGLE_OFFSET_WRITE:
+            self.saved_position_offset = self.position_offset
+        elif command == lx16a.SERVO_ANGLE_OFFSET_READ:
+            return [_unsigned(self.position_offset, 8)]
+        elif command == lx16a.SERVO_ANGLE_LIMIT_WRITE:
+            self.position_limits = (word(params[0], params[1]), word(params[2], params[3]))
+        elif command == lx16a.SERVO_ANGLE_LIMIT_READ:
+            return [lower_byte(self.position_limits[0]), higher_byte(self.position_limits[0]),
+                    lower_byte(self.position_limits[1]), higher_byte(self.position_limits[1])]
+        elif command == lx16a.SERVO_VIN_LIMIT_WRITE:
+            self.voltage_limits = (word(params[0], params[1]), word(params[2], params[3]))
+        elif command == lx16a.SERVO_VIN_LIMIT_READ:
+            return [lower_byte(self.voltage_limits[0]), higher_byte(self.voltage_limits[0]),
+                    lower_byte(self.voltage_limits[1]), higher_byte(self.voltage_limits[1])]
+        elif command == lx16a.SERVO_TEMP_MAX_LIMIT_WRITE:
+            self.max_temperature = params[0]
+        elif command == lx16a.SERVO_TEMP_MAX_LIMIT_READ:
+            return [self.max_temperature]
+        elif command == lx16a.SERVO_TEMP_READ:
+            return [self.temperature]
+        elif command == lx16a.SERVO_VIN_READ:
+            return [lower_byte(self.voltage), higher_byte(self.voltage)]
+        elif command == lx16a.SERVO_POS_READ:
+            position = _unsigned(self.position_at(now), 16)
+            return [lower_byte(position), higher_byte(position)]
+        elif command == lx16a.SERVO_OR_MOTOR_MODE_WRITE:
+            self.mode = params[0]
+            self.speed = _signed(word(params[2], params[3]), 16) if self.mode == 1 else 0
+            if self.mode == 0:
+                self.stop(now)
+        elif command == lx16a.SERVO_OR_MOTOR_MODE_READ:
+            speed = _unsigned(self.speed, 16)
+            return [self.mode, 0, lower_byte(speed), higher_byte(speed)]
+        elif command == lx16a.SERVO_LOAD_OR_UNLOAD_WRITE:
+            self.motor_on = params[0] == 1
+        elif command == lx16a.SERVO_LOAD_OR_UNLOAD_READ:
+            return [1 if self.motor_on else 0]
+        elif command == lx16a.SERVO_LED_CTRL_WRITE:
+            self.led_on = params[0] == 0
+        elif command == lx16a.SERVO_LED_CTRL_READ:
+            return [0 if self.led_on else 1]
+        elif command == lx16a.SERVO_LED_ERROR_WRITE:
+            self.led_errors = params[0]
+        elif command == lx16a.SERVO_LED_ERROR_READ:
+            return [self.led_errors]
+        return None
+
+
+class _SimulatedPort(object):
+    """Base class for simulated serial ports.
+
+    Models wire time of transmitted and received data (based on baud rate),
+    response latency and faults: dropped bytes and corrupted responses.
+    """
+
+    def __init__(self, baudrate=115200, latency=0.0005,
+                 drop_rate=0.0, corrupt_rate=0.0, seed=None, timeout=None,
+                 echo=False):
+        """
+        Args:
+            baudrate - baud rate used to calculate wire time
+                (None to make data transfer instant)
+            latency - delay between end of request and start of response
+                in seconds
+            drop_rate - probability of each response byte to be lost
+            corrupt_rate - probability of each response to have a bit flipped
+            seed - random seed for fault injection
+            timeout - initial read timeout
+            echo - if True, written data is received back (like with
+                one-wire half-duplex adapters)
+        """
+        self.baudrate = baudrate
+        self.latency = latency
+        self.drop_rate = drop_rate
+        self.corrupt_rate = corrupt_rate
+        self.timeout = timeout
+        self.echo = echo
+        self.is_open = True
+
+        self.requests = 0
+        self.responses = 0
+        self.dropped_bytes = 0
+        self.corrupted_responses = 0
+
+        self._random = random.Random(seed)
+        self._lock = threading.Condition()
+        self._rx = bytearray()
+        self._scheduled = []
+        self._bus_free_at = 0.0
+
+    def _wire_time(self, size):
+        if not self.baudrate:
+            return 0.0
+        return size * 10.0 / self.baudrate
+
+    def _schedule_response(self, data, not_before):
+        """Schedules response data to arrive after bus is free.
+        Must be called with lock held."""
+        if self.drop_rate:
+            kept = bytearray()
+            for octet in data:
+                if self._random.random() < self.drop_rate:
+                    self.dropped_bytes += 1
+                else:
+                    kept.append(octet)
+            data = kept
+
+        if self.corrupt_rate and data and self._random.random() < self.corrupt_rate:
+            data = bytearray(data)
+            data[self._random.randrange(len(data))] ^= 1 << self._random.randrange(8)
+            self.corrupted_responses += 1
+
+        start = max(not_before + self.latency, self._bus_free_at)
+        end = start + self._wire_time(len(data))
+        self._bus_free_at = end
+        self._scheduled.append((end, bytes(data)))
+        self.responses += 1
+
+    def _process(self, data, now):
+        """Handles written data, should call `_schedule_response` for
+        each response. Called with lock held."""
+        raise NotImplementedError()
+
+    def _deliver(self, now):
+        while self._scheduled and self._scheduled[0][0] <= now:
+            self._rx += self._scheduled.pop(0)[1]
+
+    def write(self, data):
+        data = bytes(data)
+        with self._lock:
+            now = time.monotonic()
+            start = max(now, self._bus_free_at)
+            self._bus_free_at = start + self._wire_time(len(data))
+            if self.echo:
+                self._scheduled.append((self._bus_free_at, data))
+            self._process(data, self._bus_free_at)
+            self._lock.notify_all()
+        return len(data)
+
+    def read(self, size=1):
+        deadline = None if self.timeout is None else time.monotonic() + self.timeout
+        with self._lock:
+            while True:
+                now = time.monotonic()
+                self._deliver(now)
+                if len(self._rx) >= size or not self.is_open:
+                    break
+
+                wait = None
+                if deadline is not None:
+                    wait = deadline - now
+                    if wait <= 0:
+                        break
+                if self._scheduled:
+                    next_arrival = self._scheduled[0][0] - now
+                    wait = next_arrival if wait is None else min(wait, next_arrival)
+                self._lock.wait(wait)
+
+            data = bytes(self._rx[:size])
+            del self._rx[:size]
+            return data
+
+    @property
+    def in_waiting(self):
+        with self._lock:
+            self._deliver(time.monotonic())
+            return len(self._rx)
+
+    def reset_input_buffer(self):
+        with self._lock:
+            del self._rx[:]
+            del self._scheduled[:]
+
+    def close(self):
+        with self._lock:
+            self.is_open = False
+            self._lock.notify_all()
+
+
+class SimulatedBus(_SimulatedPort):
+    """Serial port with LX-16A servos attached directly (e.g. through
+    a half-duplex adapter) speaking `lewansoul_lx16a` protocol.
+
+    Broadcast queries answered by multiple servos collide and produce
+    garbled data, like on a real bus.
+    """
+
+    def __init__(self, servos=(), **kwargs):
+        super(SimulatedBus, self).__init__(**kwargs)
+        self.servos = list(servos)
+        self._decoder = lx16a.PacketDecoder()
+
+    def servo(self, servo_id):
+        for servo in self.servos:
+            if servo.servo_id == servo_id:
+                return servo
+        return None
+
+    def _process(self, data, now):
+        self._decoder.feed(data)
+        for packet in self._decoder.decode():
+            self.requests += 1
+            servo_id, command, params = packet[2], packet[4], packet[5:-1]
+
+            responses = []
+            for servo in list(self.servos):
+                if servo_id not in (lx16a.SERVO_ID_ALL, servo.servo_id):
+                    continue
+                result = servo.handle(command, params, now)
+                if result is not None:
+                    responses.append(lx16a.encode_packet(servo.servo_id, command, *result))
+
+            if not responses:
+                continue
+
+            response = responses[0]
+            for other in responses[1:]:
+                # Simultaneous transmissions collide
+                response = bytearray(
+                    a & b for a, b in zip(response.ljust(len(other), b'\xff'),
+                                          other.ljust(len(response), b'\xff'))
+                )
+            self._schedule_response(response, now)
+
+
+class SimulatedControllerBoard(_SimulatedPort):
+    """Serial port of LewanSoul Bus Servo Controller board speaking
+    `lewansoul_lx16a_controller` protocol."""
+
+    def __init__(self, servos=(), battery_voltage=7400, **kwargs):
+        kwargs.setdefault('baudrate', 9600)
+        super(SimulatedControllerBoard, self).__init__(**kwargs)
+        self.servos = list(servos)
+        self.battery_voltage = battery_voltage
+        self._decoder = lx16a_controller.PacketDecoder()
+
+    def servo(self, servo_id):
+        for servo in self.servos:
+            if servo.servo_id == servo_id:
+                return servo
+        return None
+
+    def _respond(self, command, params, now):
+        self._schedule_response(
+            bytearray([0x55, 0x55, 2 + len(params), command] + params), now,
+        )
+
+    def _process(self, data, now):
+        self._decoder.feed(data)
+        for packet in self._decoder.decode():
+            self.requests += 1
+            command, params = packet[3], packet[4:]
+
+            if command == lx16a_controller.CMD_SERVO_MOVE:
+                count, duration = params[0], word(params[1], params[2])
+                for i in range(count):
+                    servo = self.servo(params[3 + 3*i])
+                    if servo is not None:
+                        servo.move(word(params[4 + 3*i], params[5 + 3*i]), duration, now)
+            elif command == lx16a_controller.CMD_GET_BATTERY_VOLTAGE:
+                self._respond(command, [lower_byte(self.battery_voltage),
+                                        higher_byte(self.battery_voltage)], now)
+            elif command == lx16a_controller.CMD_MULT_SERVO_UNLOAD:
+                for servo_id in params[1:1 + params[0]]:
+                    servo = self.servo(servo_id)
+                    if servo is not None:
+                        servo.motor_on = False
+            elif command == lx16a_controller.CMD_MULT_SERVO_POS_READ:
+                response = []
+                for servo_id in params[1:1 + params[0]]:
+                    servo = self.servo(servo_id)
+                    if servo is None:
+                        continue
+                    position = _unsigned(servo.position_at(now), 16)
+                    response += [servo_id, lower_byte(position), higher_byte(position)]
+                self._respond(command, [len(response) // 3] + response, now)
@@ -0,0 +1,240 @@
+"""Shared memory table of servo state for multi-process consumers.
+
+One process owns serial port and runs `StatePublisher` which polls servo
+telemetry and writes latest values into a fixed-layout memory-mapped
+file (use a file on tmpfs, e.g. in /dev/shm, to keep it in memory):
+
+    controller = lewansoul_lx16a.ServoController(serial)
+    publisher = StatePublisher('/dev/shm/lx16a-state', controller, [1, 2, 3])
+    publisher.start()
+
+Any number of other processes read it without serial access or IPC
+round trips:
+
+    reader = StateReader('/dev/shm/lx16a-state')
+    print(reader.read(1).position)
+
+Each servo has its own slot guarded by a sequence lock: publisher makes
+slot sequence number odd while updating slot and even when done, readers
+retry if sequence number was odd or has changed while reading.
+"""
+
+__all__ = [
+    'StatePublisher',
+    'StateReader',
+    'ServoState',
+    'STATE_FIELDS',
+]
+
+
+from collections import namedtuple
+import mmap
+import struct
+import time
+
+from lewansoul_lx16a import TimeoutError
+from lewansoul_lx16a_telemetry import TelemetryPoller
+
+
+MAGIC = b'LX16ASTA'
+VERSION = 1
+SLOTS = 256
+
+#: Servo state fields stored in table, in order of flag bits
+STATE_FIELDS = (
+    'position', 'voltage', 'temperature', 'mode', 'speed',
+    'motor_on', 'led_on', 'led_errors',
+)
+
+# Magic, version, number of slots
+_HEADER = struct.Struct('<8sII')
+# Sequence number
+_SEQ = struct.Struct('<I')
+# Field flags, servo ID, timestamp, position, voltage, speed,
+# temperature, mode, motor on, LED on, LED errors
+_SLOT_DATA = struct.Struct('<HBxdhHhBBBBB5x')
+_SLOT_SIZE = _SEQ.size + _SLOT_DATA.size
+
+_DEFAULT_RATES = {
+    'position': 20, 'voltage': 1, 'temperature': 1, 'mode': 1, 'speed': 1,
+    'motor_on': 1, 'led_on': 0.5, 'led_errors': 1,
+}
+
+
+ServoState = namedtuple('ServoState', ('servo_id', 'timestamp') + STATE_FIELDS)
+ServoState.__doc__ = """Latest known state of a servo.
+
+Attributes:
+    servo_id - servo ID
+    timestamp - time.monotonic() time of last update
+    position, voltage, temperature, mode, speed, motor_on, led_on,
+    led_errors - latest field values (None if never received)
+"""
+
+
+def _slot_offset(servo_id):
+    return _HEADER.size + servo_id * _SLOT_SIZE
+
+
+def _check_header(buf, path):
+    magic, version, slots = _HEADER.unpack_from(buf, 0)
+    if magic != MAGIC or version != VERSION or slots != SLOTS:
+        raise ValueError('%s is not a servo state table' % path)
+
+
+class StatePublisher(object):
+    """Polls servo telemetry and publishes it into shared state table.
+
+    Table file is created (or overwritten) on construction. There must
+    be only one publisher per table.
+    """
+
+    def __init__(self, path, controller, servo_ids=(), rates=None, timeout=None):
+        """
+        Args:
+            path - state table file path
+            controller - lewansoul_lx16a.ServoController instance
+            servo_ids - IDs of servos to poll
+            rates - dict mapping field name to sampling rate in Hz
+                (see `lewansoul_lx16a_telemetry.TelemetryPoller`)
+            timeout - timeout of individual query
+        """
+        self.path = path
+        self._file = open(path, 'w+b')
+        self._file.truncate(_HEADER.size + SLOTS * _SLOT_SIZE)
+        self._mmap = mmap.mmap(self._file.fileno(), 0)
+        _HEADER.pack_into(self._mmap, 0, MAGIC, VERSION, SLOTS)
+
+        self._values = {}
+        self.poller = TelemetryPoller(
+            controller, servo_ids, rates=rates or _DEFAULT_RATES, timeout=timeout,
+        )
+        self.poller.subscribe(self._on_snapshot)
+
+    def _on_snapshot(self, snapshot):
+        for servo_id, values in snapshot.values.items():
+            self.publish(servo_id, values, snapshot.timestamp)
+
+    def publish(self, servo_id, values, timestamp=None):
+        """Updates servo slot with given field values.
+
+        Args:
+            servo_id - servo ID
+            values - dict mapping field name (see STATE_FIELDS) to value
+            timestamp - time.monotonic() time of values
+        """
+        if timestamp is None:
+            timestamp = time.monotonic()
+
+        state = self._values.setdefault(servo_id, {})
+        state.update(values)
+
+        flags = 0
+        for bit, field in enumerate(STATE_FIELDS):
+            if field in state:
+                flags |= 1 << bit
+
+        offset = _slot_offset(servo_id)
+        buf = self._mmap
+        seq = _SEQ.unpack_from(buf, offset)[0]
+        _SEQ.pack_into(buf, offset, (seq + 1) & 0xffffffff)
+        _SLOT_DATA.pack_into(
+            buf, offset + _SEQ.size, flags, servo_id, timestamp,
+            state.get('position', 0), state.get('voltage', 0), state.get('speed', 0),
+            state.get('temperature', 0), state.get('mode', 0),
+            state.get('motor_on', False), state.get('led_on', False),
+            state.get('led_errors', 0),
+        )
+        _SEQ.pack_into(buf, offset, (seq + 2) & 0xffffffff)
+
+    def start(self):
+        self.poller.start()
+
+    def stop(self):
+        self.poller.stop()
+
+    def close(self):
+        self.stop()
+        if self._mmap is not None:
+            self._mmap.close()
+            self._file.close()
+            self._mmap = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+class StateReader(object):
+    """Reader of shared servo state table published by `StatePublisher`."""
+
+    def __init__(self, path, max_attempts=1000):
+        """
+        Args:
+            path - state table file path
+            max_attempts - maximum number of attempts to read consistent
+                slot contents while it is being updated
+        """
+        self.path = path
+        self.max_attempts = max_attempts
+        with open(path, 'rb') as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        _check_header(self._mmap, path)
+
+    def read(self, servo_id):
+        """Returns ServoState of given servo or None if it was never published.
+
+        Raises:
+            TimeoutError if slot could not be read consistently
+        """
+        offset = _slot_offset(servo_id)
+        buf = self._mmap
+        for attempt in range(self.max_attempts):
+            seq = _SEQ.unpack_from(buf, offset)[0]
+            if seq & 1:
+                # Publisher is in the middle of update
+                time.sleep(0)
+                continue
+
+            data = _SLOT_DATA.unpack_from(buf, offset + _SEQ.size)
+            if _SEQ.unpack_from(buf, offset)[0] == seq:
+                break
+        else:
+            raise TimeoutError('Failed to read state of servo %d' % servo_id)
+
+        if seq == 0:
+            return None
+
+        flags, sid, timestamp = data[:3]
+        values = (
+            data[3], data[4], data[6], data[7], data[5],
+            bool(data[8]), bool(data[9]), data[10],
+        )
+        return ServoState(sid, timestamp, *(
+            value if flags & (1 << bit) else None
+            for bit, value in enumerate(values)
+        ))
+
+    def servo_ids(self):
+        """Returns list of IDs of servos published so far."""
+        return [
+            servo_id for servo_id in range(SLOTS)
+            if _SEQ.unpack_from(self._mmap, _slot_offset(servo_id))[0] != 0
+        ]
+
+    def read_all(self):
+        """Returns dict mapping servo ID to ServoState of all published servos."""
+        return {servo_id: self.read(servo_id) for servo_id in self.servo_ids()}
+
+    def close(self):
+        if self._mmap is not None:
+            self._mmap.close()
+            self._mmap = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
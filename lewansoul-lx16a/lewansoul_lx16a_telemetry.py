@@ -0,0 +1,275 @@
+__all__ = [
+    'TelemetryPoller',
+    'TelemetrySnapshot',
+    'FIELDS',
+]
+
+
+from collections import namedtuple, Counter, OrderedDict
+import heapq
+import threading
+import time
+
+from lewansoul_lx16a import (
+    TimeoutError, CancelledError, CancellationToken, LOGGER,
+    SERVO_POS_READ, SERVO_VIN_READ, SERVO_TEMP_READ,
+    SERVO_OR_MOTOR_MODE_READ, SERVO_LOAD_OR_UNLOAD_READ,
+    SERVO_LED_CTRL_READ, SERVO_LED_ERROR_READ,
+    _decode_position, _decode_voltage, _decode_temperature,
+    _decode_mode, _decode_motor_speed, _decode_motor_on,
+    _decode_led_on, _decode_led_errors,
+)
+
+
+#: Maps telemetry field name to servo query command and response decoder
+FIELDS = OrderedDict([
+    ('position', (SERVO_POS_READ, _decode_position)),
+    ('voltage', (SERVO_VIN_READ, _decode_voltage)),
+    ('temperature', (SERVO_TEMP_READ, _decode_temperature)),
+    ('mode', (SERVO_OR_MOTOR_MODE_READ, _decode_mode)),
+    ('speed', (SERVO_OR_MOTOR_MODE_READ, _decode_motor_speed)),
+    ('motor_on', (SERVO_LOAD_OR_UNLOAD_READ, _decode_motor_on)),
+    ('led_on', (SERVO_LED_CTRL_READ, _decode_led_on)),
+    ('led_errors', (SERVO_LED_ERROR_READ, _decode_led_errors)),
+])
+
+
+TelemetrySnapshot = namedtuple('TelemetrySnapshot', ['timestamp', 'values'])
+TelemetrySnapshot.__doc__ = """Telemetry values received in one polling round.
+
+Attributes:
+    timestamp - time.monotonic() time when values were received
+    values - dict mapping servo ID to dict mapping field name to value
+"""
+
+
+class TelemetryPoller(object):
+    """Polls telemetry of multiple servos with per-field sampling rates.
+
+    Each (servo, field) pair is scheduled independently to its own
+    deadline. On each round all due queries are sent as one batch (see
+    `ServoController.query_many`) in earliest-deadline-first order,
+    fields sharing the same command are queried once. If requested rates
+    exceed bus capacity, samples are delayed rather than queued up, so
+    the bus is kept busy but never accumulates backlog.
+
+    Example:
+
+        poller = TelemetryPoller(controller, [1, 2, 3], rates={
+            'position': 50, 'voltage': 1, 'temperature': 1,
+            'led_errors': 0.2,
+        })
+        poller.subscribe(print)
+        poller.start()
+    """
+
+    def __init__(self, controller, servo_ids=(), rates=None, timeout=None):
+        """
+        Args:
+            controller - lewansoul_lx16a.ServoController instance
+            servo_ids - IDs of servos to poll
+            rates - dict mapping field name (see FIELDS) to sampling rate in Hz
+            timeout - timeout of individual query
+        """
+        rates = rates or {'position': 10, 'voltage': 1, 'temperature': 1}
+        for field in rates:
+            if field not in FIELDS:
+                raise ValueError('Unknown telemetry field %s' % field)
+
+        self._controller = controller
+        self._timeout = timeout
+        self._periods = {field: 1.0 / rate for field, rate in rates.items() if rate > 0}
+
+        self._lock = threading.Lock()
+        self._servo_ids = set()
+        self._schedule = []
+        self._subscribers = []
+        self._latest = {}
+
+        # Maps (servo_id, field) to [first sample time, last sample time, count]
+        self._samples = {}
+        self._timeouts = Counter()
+
+        self._thread = None
+        self._stop = threading.Event()
+        self._cancel = CancellationToken()
+
+        for servo_id in servo_ids:
+            self.add_servo(servo_id)
+
+    @property
+    def servo_ids(self):
+        return frozenset(self._servo_ids)
+
+    def add_servo(self, servo_id):
+        with self._lock:
+            if servo_id in self._servo_ids:
+                return
+            self._servo_ids.add(servo_id)
+            self._schedule = [
+                entry for entry in self._schedule if entry[1] != servo_id
+            ]
+            heapq.heapify(self._schedule)
+            now = time.monotonic()
+            for field in self._periods:
+                heapq.heappush(self._schedule, (now, servo_id, field))
+
+    def remove_servo(self, servo_id):
+        with self._lock:
+            self._servo_ids.discard(servo_id)
+            self._latest.pop(servo_id, None)
+            # Schedule entries of removed servo are dropped lazily
+
+    def subscribe(self, callback):
+        """Registers callback to be called with TelemetrySnapshot
+        after each polling round. Callbacks are called from poller thread."""
+        self._subscribers.append(callback)
+
+    def unsubscribe(self, callback):
+        self._subscribers.remove(callback)
+
+    def latest(self, servo_id):
+        """Returns dict mapping field name to (value, timestamp) tuple
+        for most recent values of given servo."""
+        return dict(self._latest.get(servo_id, {}))
+
+    def achieved_rates(self):
+        """Returns dict mapping field name to sampling rate (in Hz per servo)
+        achieved since poller creation or last `reset_rates` call.
+
+        Rate is number of intervals between samples divided by time
+        between first and last sample, averaged over servos.
+        """
+        intervals = Counter()
+        elapsed = Counter()
+        for (servo_id, field), (first, last, count) in list(self._samples.items()):
+            if servo_id in self._servo_ids:
+                intervals[field] += count - 1
+                elapsed[field] += last - first
+        return {
+            field: intervals[field] / elapsed[field] if elapsed[field] > 0 else 0.0
+            for field in self._periods
+        }
+
+    def timeouts(self):
+        """Returns dict mapping field name to number of timed out queries."""
+        return dict(self._timeouts)
+
+    def reset_rates(self):
+        self._samples.clear()
+        self._timeouts.clear()
+
+    def _pop_due(self, now):
+        due = []
+        with self._lock:
+            while self._schedule and self._schedule[0][0] <= now:
+                deadline, servo_id, field = heapq.heappop(self._schedule)
+                if servo_id not in self._servo_ids:
+                    continue
+                due.append((deadline, servo_id, field))
+        return due
+
+    def _next_deadline(self):
+        with self._lock:
+            return self._schedule[0][0] if self._schedule else None
+
+    def poll_once(self):
+        """Queries all due fields. Returns TelemetrySnapshot or None
+        if nothing was due."""
+        due = self._pop_due(time.monotonic())
+        if not due:
+            return None
+
+        queries = OrderedDict()
+        for _, servo_id, field in due:
+            command, _ = FIELDS[field]
+            queries.setdefault((servo_id, command), []).append(field)
+
+        try:
+            responses = self._controller.query_many(
+                list(queries), timeout=self._timeout, cancel=self._cancel,
+            )
+        except CancelledError:
+            # Keep due fields scheduled for when polling is resumed
+            with self._lock:
+                for entry in due:
+                    heapq.heappush(self._schedule, entry)
+            raise
+        timestamp = time.monotonic()
+
+        values = {}
+        for (servo_id, command), fields in queries.items():
+            response = responses[(servo_id, command)]
+            for field in fields:
+                if isinstance(response, TimeoutError):
+                    self._timeouts[field] += 1
+                    continue
+
+                value = FIELDS[field][1](response)
+                values.setdefault(servo_id, {})[field] = value
+                self._latest.setdefault(servo_id, {})[field] = (value, timestamp)
+                sample = self._samples.get((servo_id, field))
+                if sample is None:
+                    self._samples[(servo_id, field)] = [timestamp, timestamp, 1]
+                else:
+                    sample[1] = timestamp
+                    sample[2] += 1
+
+        with self._lock:
+            for deadline, servo_id, field in due:
+                if servo_id not in self._servo_ids:
+                    continue
+                heapq.heappush(
+                    self._schedule,
+                    (max(deadline + self._periods[field], timestamp), servo_id, field),
+                )
+
+        snapshot = TelemetrySnapshot(timestamp=timestamp, values=values)
+        for callback in list(self._subscribers):
+            try:
+                callback(snapshot)
+            except Exception:
+                LOGGER.exception('Telemetry subscriber failed')
+
+        return snapshot
+
+    def start(self):
+        if self._thread is not None:
+            return
+
+        self._stop.clear()
+        self._cancel = CancellationToken()
+        self._thread = threading.Thread(
+            target=self._run, name='lx16a-telemetry', daemon=True,
+        )
+        self._thread.start()
+
+    def stop(self):
+        if self._thread is None:
+            return
+
+        self._stop.set()
+        # Abort query that is waiting for response
+        self._cancel.cancel()
+        self._thread.join()
+        self._thread = None
+
+    def _run(self):
+        while not self._stop.is_set():
+            deadline = self._next_deadline()
+            if deadline is None:
+                self._stop.wait(0.1)
+                continue
+
+            delay = deadline - time.monotonic()
+            if delay > 0:
+                self._stop.wait(delay)
+                continue
+
+            try:
+                self.poll_once()
+            except CancelledError:
+                break
+            except Exception:
+                LOGGER.exception('Telemetry polling failed')
+                self._stop.wait(0.1)
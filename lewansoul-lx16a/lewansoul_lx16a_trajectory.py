@@ -0,0 +1,232 @@
+__all__ = [
+    'Trajectory',
+    'TrajectoryPlayer',
+    'TrajectoryStats',
+]
+
+
+from bisect import bisect_right
+from collections import namedtuple
+import threading
+import time
+
+from lewansoul_lx16a import LOGGER
+
+
+TrajectoryStats = namedtuple('TrajectoryStats', [
+    'ticks', 'late_ticks', 'overruns', 'max_lateness',
+])
+TrajectoryStats.__doc__ = """Trajectory playback statistics.
+
+Attributes:
+    ticks - number of control ticks sent
+    late_ticks - number of ticks sent later than `late_threshold` after
+        their deadline
+    overruns - number of ticks skipped because player was late for more
+        than one control period
+    max_lateness - maximum delay of tick after its deadline in seconds
+"""
+
+
+class Trajectory(object):
+    """Time-parameterized multi-servo trajectory.
+
+    Positions of servos between waypoints are interpolated linearly.
+    """
+
+    def __init__(self, servo_ids, timestamps, positions):
+        """
+        Args:
+            servo_ids - list of servo IDs
+            timestamps - increasing list of waypoint times in seconds
+                (relative to trajectory start)
+            positions - list of waypoints, each waypoint is a list of
+                positions for corresponding servos in `servo_ids`
+        """
+        if len(timestamps) == 0:
+            raise ValueError('Trajectory should have at least one waypoint')
+        if len(timestamps) != len(positions):
+            raise ValueError('Number of timestamps and positions do not match')
+        for waypoint in positions:
+            if len(waypoint) != len(servo_ids):
+                raise ValueError('Number of positions does not match number of servos')
+
+        self.servo_ids = list(servo_ids)
+        self.timestamps = [float(t) for t in timestamps]
+        self.positions = [list(waypoint) for waypoint in positions]
+
+    @property
+    def duration(self):
+        return self.timestamps[-1]
+
+    def sample(self, t):
+        """Returns list of servo positions at time `t`."""
+        timestamps = self.timestamps
+        idx = bisect_right(timestamps, t)
+        if idx == 0:
+            return list(self.positions[0])
+        if idx == len(timestamps):
+            return list(self.positions[-1])
+
+        t0, t1 = timestamps[idx-1], timestamps[idx]
+        p0, p1 = self.positions[idx-1], self.positions[idx]
+        k = (t - t0) / (t1 - t0)
+        return [a + (b - a) * k for a, b in zip(p0, p1)]
+
+
+class TrajectoryPlayer(object):
+    """Streams trajectories to servos at a fixed control rate.
+
+    On each control tick every servo gets a prepared move to its
+    trajectory position one period ahead, followed by a broadcast move
+    start, all in a single write (see `ServoController.move_many`). Ticks are
+    scheduled against absolute `time.monotonic()` deadlines, so delays do
+    not accumulate; ticks that could not be sent within one control period
+    are skipped and counted as overruns.
+
+    Example:
+
+        player = TrajectoryPlayer(controller, rate=50)
+        player.play(Trajectory([1, 2], [0, 1, 2], [[0, 0], [500, 1000], [0, 0]]))
+        player.wait()
+        print(player.stats)
+    """
+
+    def __init__(self, controller, rate=50, late_threshold=None):
+        """
+        Args:
+            controller - lewansoul_lx16a.ServoController instance
+            rate - control rate in Hz
+            late_threshold - delay after tick deadline (in seconds) after
+                which tick is considered late (default: 10% of period)
+        """
+        self._controller = controller
+        self.period = 1.0 / rate
+        self.late_threshold = (
+            late_threshold if late_threshold is not None else self.period * 0.1
+        )
+
+        self._thread = None
+        self._stop = threading.Event()
+        self._wakeup = threading.Event()
+        self._paused = False
+
+        self.error = None
+        self._reset_stats()
+
+    def _reset_stats(self):
+        self._ticks = 0
+        self._late_ticks = 0
+        self._overruns = 0
+        self._max_lateness = 0.0
+
+    @property
+    def stats(self):
+        return TrajectoryStats(
+            ticks=self._ticks,
+            late_ticks=self._late_ticks,
+            overruns=self._overruns,
+            max_lateness=self._max_lateness,
+        )
+
+    @property
+    def is_playing(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    @property
+    def is_paused(self):
+        return self._paused
+
+    def play(self, trajectory):
+        """Starts playing trajectory in background thread."""
+        if self.is_playing:
+            raise RuntimeError('Trajectory is already playing')
+
+        self._stop.clear()
+        self._wakeup.clear()
+        self._paused = False
+        self.error = None
+        self._reset_stats()
+
+        self._thread = threading.Thread(
+            target=self._run, args=(trajectory,),
+            name='lx16a-trajectory', daemon=True,
+        )
+        self._thread.start()
+
+    def wait(self, timeout=None):
+        """Waits for trajectory to finish. Returns True if it has finished."""
+        if self._thread is not None:
+            self._thread.join(timeout)
+        return not self.is_playing
+
+    def pause(self):
+        """Pauses trajectory and stops servos where they are."""
+        self._paused = True
+        self._wakeup.set()
+
+    def resume(self):
+        self._paused = False
+        self._wakeup.set()
+
+    def stop(self):
+        """Stops trajectory and servos."""
+        self._stop.set()
+        self._wakeup.set()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join()
+        self._controller.move_stop()
+
+    def _sleep(self, duration):
+        self._wakeup.wait(duration)
+        self._wakeup.clear()
+
+    def _send(self, servo_ids, positions, move_time):
+        self._controller.move_many({
+            servo_id: (int(round(position)), move_time)
+            for servo_id, position in zip(servo_ids, positions)
+        })
+
+    def _run(self, trajectory):
+        period = self.period
+        move_time = int(round(period * 1000))
+        start = time.monotonic()
+        tick = 0
+
+        try:
+            while not self._stop.is_set():
+                if self._paused:
+                    self._controller.move_stop()
+                    paused_at = time.monotonic()
+                    while self._paused and not self._stop.is_set():
+                        self._sleep(None)
+                    start += time.monotonic() - paused_at
+                    continue
+
+                deadline = start + tick * period
+                now = time.monotonic()
+                if now < deadline:
+                    self._sleep(deadline - now)
+                    continue
+
+                lateness = now - deadline
+                self._max_lateness = max(self._max_lateness, lateness)
+                if lateness >= period:
+                    missed = int(lateness / period)
+                    self._overruns += missed
+                    tick += missed
+                    lateness -= missed * period
+
+                if lateness > self.late_threshold:
+                    self._late_ticks += 1
+
+                t = (tick + 1) * period
+                self._send(trajectory.servo_ids, trajectory.sample(t), move_time)
+                self._ticks += 1
+                tick += 1
+
+                if t >= trajectory.duration:
+                    break
+        except Exception as e:
+            LOGGER.exception('Trajectory playback failed')
+            self.error = e
@@ -7,19 +7,37 @@ setup(
     author='Maxim Kulkin',
     author_email='maxim.kulkin@gmail.com',
     url='https://github.com/maximkulkin/lewansoul-lx16a',
-    py_modules=['lewansoul_lx16a', 'lewansoul_lx16a_controller'],
+    py_modules=[
+        'lewansoul_lx16a',
+        'lewansoul_lx16a_async',
+        'lewansoul_lx16a_capture',
+        'lewansoul_lx16a_controller',
+        'lewansoul_lx16a_group',
+        'lewansoul_lx16a_server',
+        'lewansoul_lx16a_sim',
+        'lewansoul_lx16a_state',
+        'lewansoul_lx16a_telemetry',
+        'lewansoul_lx16a_trajectory',
+    ],
     license='MIT',
+    python_requires='>=3.7',
     classifiers=[
         'Development Status :: 5 - Production/Stable',
         'Intended Audience :: Developers',
         'License :: OSI Approved :: MIT License',
         'Programming Language :: Python :: 3',
-        'Programming Language :: Python :: 3.3',
-        'Programming Language :: Python :: 3.4',
-        'Programming Language :: Python :: 3.5',
-        'Programming Language :: Python :: 3.6',
+        'Programming Language :: Python :: 3.7',
+        'Programming Language :: Python :: 3.8',
+        'Programming Language :: Python :: 3.9',
+        'Programming Language :: Python :: 3.10',
+        'Programming Language :: Python :: 3.11',
+        'Programming Language :: Python :: 3.12',
         'Programming Language :: Python :: Implementation :: CPython',
         'Programming Language :: Python :: Implementation :: PyPy',
     ],
     install_requires=['pyserial'],
+    extras_require={
+        'asyncio': ['pyserial-asyncio'],
+        'numpy': ['numpy'],
+    },
 )